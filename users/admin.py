@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CustomUser
+from .models import AuthToken, CustomUser, OutboxEmail
 from .forms import CustomUserCreationForm
 from django.contrib.auth.admin import UserAdmin
 
@@ -21,4 +21,17 @@ class CustomUserAdmin(admin.ModelAdmin):
             }
         ),
         *UserAdmin.fieldsets,
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+
+
+@admin.register(AuthToken)
+class AuthTokenAdmin(admin.ModelAdmin):
+    list_display = ['user', 'created_at', 'expires_at']
+    raw_id_fields = ['user']
+    exclude = ['key']
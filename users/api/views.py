@@ -2,15 +2,16 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from .serializers import RegistrationSerializer, CustomUserSerializer
-from django.contrib.auth import get_user_model, authenticate
+from django.contrib.auth import get_user_model
 from rest_framework import status, generics
-from rest_framework.authtoken.models import Token
 from django.core.exceptions import ValidationError
-from django.core.mail import EmailMultiAlternatives
 from django.contrib.auth.tokens import default_token_generator, PasswordResetTokenGenerator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string
+from users.outbox import queue_email
+from users.models import AuthToken
+from users.throttles import LoginAccountThrottle, LoginIPThrottle
+from users.tokens import create_token, revoke_tokens, rotate_token
 import os
 
 
@@ -41,7 +42,7 @@ class RegistrationView(APIView):
 
         - Validates the data using the `RegistrationSerializer`.
         - Saves the user account as inactive.
-        - Sends an email with a verification link.
+        - Puts an email with a verification link into the outbox, which is sent by a job on the `email` queue.
         """
         serializer = RegistrationSerializer(data=request.data)
         data = {}
@@ -60,14 +61,12 @@ class RegistrationView(APIView):
                 frontend_domain}/verify-email?uid={uid}&token={token}'
 
             context = {
-                'user': saved_account,
+                'user': {'email': saved_account.email, 'username': saved_account.username},
                 'verification_url': verification_url,
             }
             subject = 'Please confirm your email address.'
-            from_email = os.environ.get('DEFAULT_FROM_EMAIL')
             recipient_list = [saved_account.email]
 
-            html_content = render_to_string('email_verification.html', context)
             text_content = f"""
             Hello {saved_account.email},
 
@@ -79,10 +78,7 @@ class RegistrationView(APIView):
             The Videoflix Team
             """
 
-            email = EmailMultiAlternatives(
-                subject, text_content, from_email, recipient_list)
-            email.attach_alternative(html_content, 'text/html')
-            email.send()
+            queue_email('email_verification.html', subject, text_content, context, recipient_list)
 
             return Response({
                 'message': 'Registration successful. Please check your email inbox to confirm your account.',
@@ -97,43 +93,47 @@ class LoginView(APIView):
 
     This view allows users to log in by providing their username and password. 
     If the credentials are correct, a token is returned to authenticate further requests.
+    Attempts are rate limited per IP and per account before any password is hashed.
     """
     permission_classes = [AllowAny]
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
     User = get_user_model()
 
     def post(self, request, *arg, **kwarg):
         """
         Handle user login.
 
-        - Validates the username and password provided in the request data.
-        - Authenticates the user and returns a token if credentials are correct.
+        - Loads the user in one query.
+        - Checks the password. For unknown usernames a dummy password is hashed, so the response
+          time does not reveal whether an account exists. A missing password is treated as an empty
+          one, so it is hashed as well.
+        - Creates a new expiring token for this login (device).
 
         Returns:
-            - 200 OK: On successful login, returns the token and user info.
+            - 200 OK: On successful login, returns the token, its expiry and user info.
             - 400 Bad Request: If the provided credentials are incorrect.
+            - 429 Too Many Requests: If the IP or the account made too many attempts.
         """
         username = request.data.get('username')
-        password = request.data.get('password')
+        password = request.data.get('password') or ''
 
         try:
             user = self.User.objects.get(username=username)
         except self.User.DoesNotExist:
+            self.User().set_password(password)
             return Response({'detail': 'Wrong log in data.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        user = authenticate(
-            request=request, username=user.username, password=password)
-        if not user:
+        if not user.check_password(password) or not user.is_active:
             return Response({'detail': 'Wrong log in data.'}, status=status.HTTP_400_BAD_REQUEST)
 
         if not user.is_email_verified:  
             return Response({'detail': 'Email is not verified.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        data = {}
-
-        token, created = Token.objects.get_or_create(user=user)
+        token = create_token(user)
 
         data = {
             'token': token.key,
+            'expires_at': token.expires_at,
             'username': user.username,
             'user_id': user.id
         }
@@ -197,7 +197,7 @@ class PasswordResetRequest(APIView):
         Handle the password reset request.
 
         - Accepts the email address, validates its existence, and generates a reset token and UID.
-        - Sends a password reset email to the user if the email exists.
+        - Puts a password reset email into the outbox if the email exists.
         """
         email = request.data.get('email')
 
@@ -213,14 +213,12 @@ class PasswordResetRequest(APIView):
                 'FRONTEND_DOMAIN')}/password-reset?uid={uid}&token={token}'
 
             subject = 'Reset password'
-            from_email = os.environ.get('DEFAULT_FROM_EMAIL')
             recipent_list = [user.email]
             context = {
-                'user': user,
+                'user': {'email': user.email, 'username': user.username},
                 'reset_url': reset_url
             }
 
-            html_content = render_to_string('password_reset.html', context)
             text_content = f"""
             Hi {user.username},
 
@@ -232,10 +230,7 @@ class PasswordResetRequest(APIView):
             The Videoflix Team
             """
 
-            email = EmailMultiAlternatives(
-                subject, text_content, from_email, recipent_list)
-            email.attach_alternative(html_content, 'text/html')
-            email.send()
+            queue_email('password_reset.html', subject, text_content, context, recipent_list)
 
             return Response({'message': 'If the user exists, you will get an email with instructions.'}, status=status.HTTP_200_OK)
 
@@ -260,6 +255,7 @@ class PasswordResetConfirm(APIView):
 
         - Accepts the UID, token, and new password.
         - Validates the token and updates the user's password if the token is valid.
+        - Revokes all auth tokens of the user, so every device has to log in again with the new password.
         """
         uid = request.data.get('uid')
         token = request.data.get('token')
@@ -276,6 +272,7 @@ class PasswordResetConfirm(APIView):
             if token_generator.check_token(user, token):
                 user.set_password(new_password)
                 user.save()
+                revoke_tokens(AuthToken.objects.filter(user=user))
                 return Response({'message': 'Password reset successful.'}, status=status.HTTP_200_OK)
             else:
                 return Response({'error': 'Invalid or expired token.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -294,7 +291,52 @@ class TokenCheckView(APIView):
 
     def get(self, request):
         """
-        Checks if the user is authenticated with a valid token.
-        Returns true if the token is valid, otherwise false.
+        Checks if the user is authenticated with a valid, not expired token.
+        Returns true and the expiry of the token, which slides forward while the token is used.
+        """
+        return Response({"valid": True, "expires_at": request.auth.expires_at}, status=200)
+
+
+class TokenRefreshView(APIView):
+    """
+    Endpoint to rotate the provided token.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Replaces the token of the request with a new key and a fresh expiry. The old key stops working.
+        """
+        token = rotate_token(request.auth)
+        return Response({'token': token.key, 'expires_at': token.expires_at}, status=status.HTTP_200_OK)
+
+
+class LogoutView(APIView):
+    """
+    View to log out the current user.
+
+    The token of the request is revoked, which also removes it from the token cache
+    of `CachedTokenAuthentication`.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Revokes the token used for this request.
+        """
+        revoke_tokens(AuthToken.objects.filter(key=request.auth.key))
+        return Response({'message': 'Logout successful.'}, status=status.HTTP_200_OK)
+
+
+class LogoutAllView(APIView):
+    """
+    View to log out the current user on all devices.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Revokes every token of the current user.
         """
-        return Response({"valid": True}, status=200)
\ No newline at end of file
+        count = revoke_tokens(AuthToken.objects.filter(user=request.user))
+        return Response({'message': 'Logout successful.', 'revoked': count}, status=status.HTTP_200_OK)
@@ -0,0 +1,39 @@
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from .models import AuthToken
+from .tokens import cache_token, cached_user, invalidate_token, refresh_token, token_cache_key
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Authentication with the expiring `AuthToken`s, which keeps token -> user in the cache for
+    `AUTH_TOKEN_CACHE_TTL` seconds.
+
+    DRF's `TokenAuthentication` joins the tokens with the users on every request. Here only
+    the first request of a token does that, the following ones (catalogue calls, player heartbeats,
+    token checks) are answered from Redis with a user built from a few cached fields. Cached tokens
+    are removed on logout, when tokens are revoked or deleted and when the user is saved
+    (password reset, deactivation) or deleted, see `users.signals`.
+
+    Expired tokens are rejected. Tokens in use are refreshed (sliding expiry), see `refresh_token`.
+    """
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        cached = cache.get(token_cache_key(key))
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+        else:
+            user_fields, expires_at = cached
+            user = cached_user(user_fields)
+            token = AuthToken(key=key, user=user, expires_at=expires_at)
+            if not user.is_active:
+                raise AuthenticationFailed('User inactive or deleted.')
+
+        if token.is_expired:
+            invalidate_token(key)
+            raise AuthenticationFailed('Token has expired.')
+        if refresh_token(token) or cached is None:
+            cache_token(token)
+        return user, token
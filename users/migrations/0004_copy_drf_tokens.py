@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:05
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+
+def copy_drf_tokens(apps, schema_editor):
+    """
+    Copies the non-expiring DRF tokens into expiring tokens, so logged in users stay logged in.
+    """
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('users', 'AuthToken')
+    expires_at = timezone.now() + timedelta(seconds=getattr(settings, 'AUTH_TOKEN_TTL', 60 * 60 * 24 * 14))
+    AuthToken.objects.bulk_create(
+        (AuthToken(key=token.key, user_id=token.user_id, expires_at=expires_at) for token in Token.objects.iterator()),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_authtoken'),
+        ('authtoken', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_drf_tokens, migrations.RunPython.noop),
+    ]
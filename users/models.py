@@ -1,5 +1,9 @@
+import secrets
+from datetime import timedelta
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 
 class CustomUser(AbstractUser):
@@ -31,4 +35,84 @@ class CustomUser(AbstractUser):
     class Meta:
         ordering = ['email']
         verbose_name = "User"
-        verbose_name_plural = "User"
\ No newline at end of file
+        verbose_name_plural = "User"
+
+
+class OutboxEmail(models.Model):
+    """
+    Email waiting in the outbox until the `drain_outbox` job sends it.
+
+    The views only store the message, the HTML part is rendered from `template` and `context`
+    when the job sends it. Failed deliveries are retried with an exponential backoff
+    until `EMAIL_OUTBOX_MAX_ATTEMPTS` is reached.
+
+    Fields:
+        - template: Name of the HTML template, rendered with `context`.
+        - subject, text_content: Subject and plain text part of the message.
+        - recipients: List of recipient addresses.
+        - status: `pending`, `sent` or `failed` (given up after the last attempt).
+        - attempts, next_attempt_at, last_error: State of the delivery attempts.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    template = models.CharField(max_length=100)
+    subject = models.CharField(max_length=255)
+    text_content = models.TextField()
+    context = models.JSONField(default=dict, blank=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.subject} ({", ".join(self.recipients)})'
+
+    class Meta:
+        ordering = ['next_attempt_at']
+        verbose_name = "Outbox email"
+        verbose_name_plural = "Outbox emails"
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_attempt')]
+
+
+def generate_token_key():
+    """
+    Returns a new random token key (40 hex characters like the DRF tokens).
+    """
+    return secrets.token_hex(20)
+
+
+def token_expiry():
+    """
+    Returns the expiry of a new or refreshed token, `AUTH_TOKEN_TTL` seconds from now.
+    """
+    return timezone.now() + timedelta(seconds=getattr(settings, 'AUTH_TOKEN_TTL', 60 * 60 * 24 * 14))
+
+
+class AuthToken(models.Model):
+    """
+    Expiring auth token, one per login, so a user can be logged in on several devices
+    and log out of all of them at once.
+
+    Fields:
+        - key: The token sent in the `Authorization: Token <key>` header.
+        - user: The owner of the token.
+        - expires_at: End of the validity. It slides forward while the token is used
+          (see `users.tokens.refresh_token`), expired tokens are deleted by `delete_expired_tokens`.
+    """
+    key = models.CharField(max_length=40, unique=True, default=generate_token_key)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='auth_tokens')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=token_expiry, db_index=True)
+
+    def __str__(self):
+        return f'{self.user} - {self.expires_at}'
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
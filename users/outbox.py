@@ -0,0 +1,52 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import OutboxEmail
+import django_rq
+
+
+OUTBOX_BATCH_SIZE = getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+OUTBOX_RETRY_DELAY = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 60)
+OUTBOX_DRAIN_SCHEDULED_KEY = 'email-outbox:drain-scheduled'
+
+
+def queue_email(template, subject, text_content, context, recipients):
+    """
+    Stores an email in the outbox and makes sure a drain job runs once the current transaction
+    has been committed. The request does not wait for the mail server.
+
+    Args:
+        template (str): Name of the HTML template.
+        subject (str): Subject of the email.
+        text_content (str): Plain text part of the email.
+        context (dict): JSON serializable context of the HTML template.
+        recipients (list): Recipient addresses.
+    """
+    email = OutboxEmail.objects.create(
+        template=template, subject=subject, text_content=text_content, context=context, recipients=recipients)
+    transaction.on_commit(schedule_drain)
+    return email
+
+
+def schedule_drain(delay=None):
+    """
+    Enqueues a drain job on the `email` queue. During a burst of signups only one job is
+    enqueued, the flag is cleared by the job before it collects the pending emails.
+    Retries are scheduled with a `delay` (requires an RQ worker with `--with-scheduler`).
+    """
+    from .tasks import drain_outbox
+    queue = django_rq.get_queue('email', autocommit=True)
+    if delay is not None:
+        queue.enqueue_in(delay, drain_outbox)
+    elif cache.add(OUTBOX_DRAIN_SCHEDULED_KEY, True, timeout=60):
+        queue.enqueue(drain_outbox)
+
+
+def retry_delay(attempts):
+    """
+    Returns the backoff before the next attempt: `EMAIL_OUTBOX_RETRY_DELAY` seconds,
+    doubled with every failed attempt.
+    """
+    return timedelta(seconds=OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
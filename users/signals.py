@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import AuthToken
+from .tokens import invalidate_token, invalidate_user_tokens
+
+
+@receiver(post_save, sender=get_user_model())
+def user_post_save(sender, instance, created, **kwargs):
+    """
+    Signal handler for the `post_save` signal of the user model. The cached tokens of the user
+    are removed after the commit, so a changed password, active flag or email is seen on the
+    next request.
+    """
+    if not created:
+        transaction.on_commit(lambda: invalidate_user_tokens(instance.pk))
+
+
+@receiver(post_delete, sender=AuthToken)
+def auth_token_post_delete(sender, instance, **kwargs):
+    """
+    Signal handler for the `post_delete` signal of the auth tokens. A deleted token is removed
+    from the cache right away and again after the commit. This also covers the tokens of a deleted
+    user, which are deleted by the cascade.
+    """
+    invalidate_token(instance.key)
+    transaction.on_commit(lambda: invalidate_token(instance.key))
+
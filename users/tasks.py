@@ -0,0 +1,123 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .models import AuthToken, OutboxEmail
+from .outbox import (
+    OUTBOX_BATCH_SIZE, OUTBOX_DRAIN_SCHEDULED_KEY, OUTBOX_MAX_ATTEMPTS, retry_delay, schedule_drain,
+)
+from .tokens import AUTH_TOKEN_CLEANUP_BATCH_SIZE, TOKEN_CLEANUP_SCHEDULED_KEY, schedule_token_cleanup
+import os
+
+
+def build_message(outbox_email, connection):
+    """
+    Renders the HTML part of an outbox email and builds the multipart message.
+    """
+    html_content = render_to_string(outbox_email.template, outbox_email.context)
+    message = EmailMultiAlternatives(
+        outbox_email.subject, outbox_email.text_content, os.environ.get('DEFAULT_FROM_EMAIL'),
+        outbox_email.recipients, connection=connection)
+    message.attach_alternative(html_content, 'text/html')
+    return message
+
+
+def record_failure(outbox_email, error, now):
+    """
+    Counts a failed attempt and either schedules the next one or gives the email up.
+    """
+    outbox_email.attempts += 1
+    outbox_email.last_error = str(error)
+    if outbox_email.attempts >= OUTBOX_MAX_ATTEMPTS:
+        outbox_email.status = OutboxEmail.FAILED
+    else:
+        outbox_email.next_attempt_at = now + retry_delay(outbox_email.attempts)
+
+
+def send_batch(connection):
+    """
+    Sends up to `EMAIL_OUTBOX_BATCH_SIZE` due emails over the given connection.
+
+    The rows are locked with `SKIP LOCKED`, so several drain jobs never send the same email.
+
+    Returns:
+        tuple: Number of sent and of failed emails.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)[:OUTBOX_BATCH_SIZE]
+        )
+        sent, failed = 0, 0
+        for outbox_email in batch:
+            try:
+                build_message(outbox_email, connection).send()
+            except Exception as e:
+                record_failure(outbox_email, e, now)
+                failed += 1
+            else:
+                outbox_email.status = OutboxEmail.SENT
+                outbox_email.sent_at = now
+                outbox_email.attempts += 1
+                sent += 1
+
+        OutboxEmail.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return sent, failed
+
+
+def drain_outbox():
+    """
+    RQ job which sends all due emails of the outbox in batches over one SMTP connection.
+
+    - A failed email is retried later with an exponential backoff (see `retry_delay`).
+    - If the connection can not be opened at all, the job is retried after `EMAIL_OUTBOX_RETRY_DELAY`.
+    - For emails which are still pending afterwards a retry job is scheduled.
+    """
+    cache.delete(OUTBOX_DRAIN_SCHEDULED_KEY)
+    connection = get_connection()
+    total_sent, total_failed = 0, 0
+
+    try:
+        connection.open()
+        while True:
+            sent, failed = send_batch(connection)
+            total_sent += sent
+            total_failed += failed
+            if sent + failed == 0:
+                break
+    except Exception as e:
+        print(f'E-Mail Versand fehlgeschlagen: {str(e)}')
+        schedule_drain(retry_delay(1))
+        return total_sent
+    finally:
+        connection.close()
+
+    next_email = OutboxEmail.objects.filter(status=OutboxEmail.PENDING).order_by('next_attempt_at').first()
+    if next_email is not None:
+        schedule_drain(max(next_email.next_attempt_at - timezone.now(), timedelta(0)))
+    print(f'{total_sent} E-Mails gesendet, {total_failed} fehlgeschlagen.')
+    return total_sent
+
+
+def delete_expired_tokens():
+    """
+    Periodic RQ job on the `maintenance` queue which deletes the expired auth tokens in batches of
+    `AUTH_TOKEN_CLEANUP_BATCH_SIZE`. Every batch is one short `DELETE ... WHERE id IN (...)`, so the
+    table is never locked for long. Afterwards the next run is scheduled.
+    """
+    cache.delete(TOKEN_CLEANUP_SCHEDULED_KEY)
+    now = timezone.now()
+    total = 0
+    while True:
+        ids = list(AuthToken.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:AUTH_TOKEN_CLEANUP_BATCH_SIZE])
+        if not ids:
+            break
+        AuthToken.objects.filter(id__in=ids).delete()
+        total += len(ids)
+
+    schedule_token_cleanup()
+    print(f'{total} abgelaufene Tokens gelöscht.')
+    return total
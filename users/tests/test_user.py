@@ -1,12 +1,27 @@
+from datetime import timedelta
+from unittest import mock
 from rest_framework.test import APITestCase, APIClient
+from rest_framework import status
 from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core import mail
+from django.core.cache import cache
+from django.test import override_settings
 from django.urls import reverse
-from rest_framework import status
+from django.utils import timezone
+from django.utils.http import urlsafe_base64_encode
+from users.models import AuthToken, OutboxEmail
+from users.tasks import delete_expired_tokens, drain_outbox
+from users.tokens import token_cache_key
 
 
 User = get_user_model()
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'users-tests'},
+}
 
 
+@override_settings(CACHES=LOCMEM_CACHES)
 class UserTest(APITestCase):
     
     def setUp(self):
@@ -17,6 +32,9 @@ class UserTest(APITestCase):
             username='user@test.de', password='testpassword', email='user@test.de', is_email_verified=True)
         
         self.client = APIClient()
+        cache.clear()
+        self.django_rq = mock.patch('users.tokens.django_rq').start()
+        self.addCleanup(mock.patch.stopall)
 
 
     def test_register_user(self):
@@ -32,6 +50,55 @@ class UserTest(APITestCase):
         self.assertEqual(response.data["message"], "Registration successful. Please check your email inbox to confirm your account.")
 
 
+    def test_register_user_queues_email_in_outbox(self):
+        url = reverse('registration')
+        data = {
+            "email": "daniel@daniel.de",
+            "password": "safepassword",
+            "confirm_password": "safepassword"
+        }
+
+        with mock.patch('users.outbox.django_rq') as django_rq:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+        outbox_email = OutboxEmail.objects.get()
+        self.assertEqual(outbox_email.recipients, ["daniel@daniel.de"])
+        django_rq.get_queue.assert_called_once_with('email', autocommit=True)
+        django_rq.get_queue.return_value.enqueue.assert_called_once_with(drain_outbox)
+
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_drain_outbox_sends_pending_emails(self):
+        OutboxEmail.objects.create(
+            template='password_reset.html', subject='Reset password', text_content='Reset',
+            context={'user': {'username': 'user'}, 'reset_url': 'http://frontend/reset'}, recipients=['user@test.de'])
+
+        self.assertEqual(drain_outbox(), 1)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('http://frontend/reset', mail.outbox[0].alternatives[0][0])
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.SENT)
+
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_drain_outbox_retries_with_backoff(self):
+        outbox_email = OutboxEmail.objects.create(
+            template='password_reset.html', subject='Reset password', text_content='Reset', recipients=['user@test.de'])
+
+        with mock.patch('users.tasks.EmailMultiAlternatives.send', side_effect=OSError('Connection refused')), \
+                mock.patch('users.outbox.django_rq') as django_rq:
+            self.assertEqual(drain_outbox(), 0)
+
+        outbox_email.refresh_from_db()
+        self.assertEqual(outbox_email.status, OutboxEmail.PENDING)
+        self.assertEqual(outbox_email.attempts, 1)
+        self.assertGreater(outbox_email.next_attempt_at, outbox_email.created_at)
+        django_rq.get_queue.return_value.enqueue_in.assert_called_once()
+
+
     def test_register_user_short_password(self):
         url = reverse('registration')
         data = {
@@ -110,4 +177,151 @@ class UserTest(APITestCase):
         response = self.client.post(url, data, format='json')
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(response.data["detail"], "Wrong log in data.")
\ No newline at end of file
+        self.assertEqual(response.data["detail"], "Wrong log in data.")
+
+
+    def test_login_creates_expiring_token(self):
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse('login'), {'username': 'user@test.de', 'password': 'testpassword'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token = AuthToken.objects.get(key=response.data['token'])
+        self.assertEqual(token.user, self.user)
+        self.assertGreater(token.expires_at, timezone.now() + timedelta(days=13))
+        self.django_rq.get_queue.assert_called_once_with('maintenance', autocommit=True)
+
+
+    def test_login_throttled_per_account(self):
+        data = {'username': 'user@test.de', 'password': 'wrong'}
+        for _ in range(5):
+            self.assertEqual(self.client.post(reverse('login'), data, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(reverse('login'), {**data, 'password': 'testpassword'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+    def test_login_unknown_user_without_password_hashes(self):
+        with mock.patch('django.contrib.auth.base_user.make_password', return_value='!') as make_password:
+            response = self.client.post(reverse('login'), {'username': 'unknown@test.de'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        make_password.assert_called_once_with('')
+
+
+    def test_token_check_cached(self):
+        token = AuthToken.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.assertEqual(self.client.get(reverse('token-check')).status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('token-check'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+    def test_cached_token_without_password(self):
+        token = AuthToken.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.client.get(reverse('token-check'))
+
+        user_fields, expires_at = cache.get(token_cache_key(token.key))
+
+        self.assertNotIn(self.user.password, user_fields)
+        self.assertEqual(user_fields[0], self.user.pk)
+
+
+    def test_delete_user_invalidates_cached_token(self):
+        token = AuthToken.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.assertEqual(self.client.get(reverse('token-check')).status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        self.assertIsNone(cache.get(token_cache_key(token.key)))
+        self.assertEqual(self.client.get(reverse('token-check')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+    def test_logout_invalidates_cached_token(self):
+        token = AuthToken.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.assertEqual(self.client.get(reverse('token-check')).status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('logout'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(AuthToken.objects.filter(key=token.key).exists())
+        self.assertEqual(self.client.get(reverse('token-check')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+    def test_password_reset_invalidates_cached_token(self):
+        token = AuthToken.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.assertEqual(self.client.get(reverse('token-check')).status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('password-reset-confirm'), {
+            'uid': urlsafe_base64_encode(str(self.user.pk).encode()),
+            'token': PasswordResetTokenGenerator().make_token(self.user),
+            'new_password': 'newpassword',
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('token-check')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+    def test_expired_token_rejected(self):
+        token = AuthToken.objects.create(user=self.user, expires_at=timezone.now() - timedelta(seconds=1))
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        response = self.client.get(reverse('token-check'))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+    def test_token_expiry_slides_when_used(self):
+        token = AuthToken.objects.create(user=self.user, expires_at=timezone.now() + timedelta(days=2))
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        response = self.client.get(reverse('token-check'))
+
+        token.refresh_from_db()
+        self.assertEqual(response.data['expires_at'], token.expires_at)
+        self.assertGreater(token.expires_at, timezone.now() + timedelta(days=13))
+
+
+    def test_token_refresh_rotates_key(self):
+        token = AuthToken.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        response = self.client.post(reverse('token-refresh'))
+
+        self.assertNotEqual(response.data['token'], token.key)
+        self.assertEqual(self.client.get(reverse('token-check')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + response.data['token'])
+        self.assertEqual(self.client.get(reverse('token-check')).status_code, status.HTTP_200_OK)
+
+
+    def test_logout_all_revokes_every_token(self):
+        tokens = [AuthToken.objects.create(user=self.user) for _ in range(2)]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + tokens[0].key)
+        self.client.get(reverse('token-check'))
+
+        response = self.client.post(reverse('logout-all'))
+
+        self.assertEqual(response.data['revoked'], 2)
+        self.assertFalse(AuthToken.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.get(reverse('token-check')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+    def test_delete_expired_tokens(self):
+        AuthToken.objects.create(user=self.user, expires_at=timezone.now() - timedelta(days=1))
+        AuthToken.objects.create(user=self.admin, expires_at=timezone.now() - timedelta(days=1))
+        valid = AuthToken.objects.create(user=self.user)
+
+        with mock.patch('users.tasks.AUTH_TOKEN_CLEANUP_BATCH_SIZE', 1):
+            deleted = delete_expired_tokens()
+
+        self.assertEqual(deleted, 2)
+        self.assertEqual(list(AuthToken.objects.all()), [valid])
+        self.django_rq.get_queue.return_value.enqueue_in.assert_called_once_with(timedelta(hours=1), delete_expired_tokens)
@@ -0,0 +1,29 @@
+import hashlib
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginIPThrottle(SimpleRateThrottle):
+    """
+    Limits the login attempts per client IP (`login_ip` in `DEFAULT_THROTTLE_RATES`).
+    The history is kept in the default cache (Redis), so every worker shares it.
+    """
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginAccountThrottle(SimpleRateThrottle):
+    """
+    Limits the login attempts per account (`login_account` in `DEFAULT_THROTTLE_RATES`), so
+    guessing the password of one user from many IPs is slowed down as well. The username is
+    hashed, it is not stored in the cache in plain text.
+    """
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        username = request.data.get('username')
+        if not username:
+            return None
+        ident = hashlib.sha256(str(username).strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
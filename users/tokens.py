@@ -0,0 +1,122 @@
+import hashlib
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from .models import AuthToken, token_expiry
+import django_rq
+
+
+AUTH_TOKEN_CACHE_TTL = getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 300)
+AUTH_TOKEN_TTL = getattr(settings, 'AUTH_TOKEN_TTL', 60 * 60 * 24 * 14)
+AUTH_TOKEN_REFRESH_INTERVAL = getattr(settings, 'AUTH_TOKEN_REFRESH_INTERVAL', 60 * 60 * 24)
+AUTH_TOKEN_CLEANUP_INTERVAL = getattr(settings, 'AUTH_TOKEN_CLEANUP_INTERVAL', 60 * 60)
+AUTH_TOKEN_CLEANUP_BATCH_SIZE = getattr(settings, 'AUTH_TOKEN_CLEANUP_BATCH_SIZE', 1000)
+TOKEN_CLEANUP_SCHEDULED_KEY = 'auth-token:cleanup-scheduled'
+TOKEN_USER_FIELDS = ['id', 'username', 'email', 'is_active', 'is_staff', 'is_superuser']
+
+
+def token_cache_key(key):
+    """
+    Returns the cache key of a token. Only a hash of the token ends up in Redis.
+    """
+    return f'auth-token:user:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def invalidate_token(key):
+    """
+    Removes a token from the cache, e.g. after logout.
+    """
+    cache.delete(token_cache_key(key))
+
+
+def invalidate_user_tokens(user_id):
+    """
+    Removes the cached tokens of a user, e.g. after the password or the active flag changed.
+    """
+    cache.delete_many([token_cache_key(key) for key in AuthToken.objects.filter(user_id=user_id).values_list('key', flat=True)])
+
+
+def cache_token(token):
+    """
+    Caches token -> (user fields, expiry) for `AUTH_TOKEN_CACHE_TTL` seconds, but not beyond the expiry.
+    Only the `TOKEN_USER_FIELDS` of the user are cached, never the password hash.
+    """
+    timeout = min(AUTH_TOKEN_CACHE_TTL, int((token.expires_at - timezone.now()).total_seconds()))
+    if timeout > 0:
+        user_fields = [getattr(token.user, field) for field in TOKEN_USER_FIELDS]
+        cache.set(token_cache_key(token.key), (user_fields, token.expires_at), timeout)
+
+
+def cached_user(user_fields):
+    """
+    Builds the user of a cached token from its cached fields. The other fields are deferred
+    and loaded from the database when they are accessed.
+    """
+    User = get_user_model()
+    values = dict(zip(TOKEN_USER_FIELDS, user_fields))
+    # `from_db` expects the values in the order of the model fields.
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(DEFAULT_DB_ALIAS, field_names, [values[name] for name in field_names])
+
+
+def create_token(user):
+    """
+    Creates a new expiring token for a login and makes sure the cleanup job is scheduled.
+    """
+    token = AuthToken.objects.create(user=user)
+    schedule_token_cleanup()
+    return token
+
+
+def refresh_token(token):
+    """
+    Slides the expiry of a used token forward to `AUTH_TOKEN_TTL` from now. To keep writes rare
+    this happens at most once per `AUTH_TOKEN_REFRESH_INTERVAL` per token.
+
+    Returns:
+        bool: True if the token was refreshed.
+    """
+    remaining = token.expires_at - timezone.now()
+    if remaining > timedelta(seconds=AUTH_TOKEN_TTL - AUTH_TOKEN_REFRESH_INTERVAL):
+        return False
+    token.expires_at = token_expiry()
+    AuthToken.objects.filter(key=token.key).update(expires_at=token.expires_at)
+    return True
+
+
+def rotate_token(token):
+    """
+    Replaces a token with a new key and a fresh expiry. The old key stops working at once.
+    """
+    with transaction.atomic():
+        new_token = AuthToken.objects.create(user_id=token.user_id)
+        revoke_tokens(AuthToken.objects.filter(key=token.key))
+    return new_token
+
+
+def revoke_tokens(queryset):
+    """
+    Deletes the given tokens (logout, logout everywhere, password reset). The `post_delete` signal
+    removes them from the token cache, right away and again after the commit, so a request which
+    runs in between can not put them back for the cache lifetime.
+
+    Returns:
+        int: Number of deleted tokens.
+    """
+    keys = list(queryset.values_list('key', flat=True))
+    deleted, _ = AuthToken.objects.filter(key__in=keys).delete()
+    return deleted
+
+
+def schedule_token_cleanup():
+    """
+    Schedules the `delete_expired_tokens` job on the `maintenance` queue once per
+    `AUTH_TOKEN_CLEANUP_INTERVAL`. Requires an RQ worker started with `--with-scheduler`.
+    """
+    if cache.add(TOKEN_CLEANUP_SCHEDULED_KEY, True, timeout=AUTH_TOKEN_CLEANUP_INTERVAL):
+        from .tasks import delete_expired_tokens
+        queue = django_rq.get_queue('maintenance', autocommit=True)
+        queue.enqueue_in(timedelta(seconds=AUTH_TOKEN_CLEANUP_INTERVAL), delete_expired_tokens)
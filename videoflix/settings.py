@@ -52,6 +52,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
@@ -80,17 +81,80 @@ CSRF_TRUSTED_ORIGINS = os.environ.get('CSRF_TRUSTED_ORIGINS', '').split(',')
 
 CACHE_TTL = 60 * 15
 
+#Video transcoding: single_pass, pool, jobs, segmented or sequential
+VIDEO_TRANSCODE_MODE = os.environ.get('VIDEO_TRANSCODE_MODE', 'single_pass')
+VIDEO_TRANSCODE_CONCURRENCY = int(os.environ.get('VIDEO_TRANSCODE_CONCURRENCY', os.cpu_count() or 1))
+#Length of the source pieces which the segmented mode encodes in parallel jobs
+VIDEO_SPLIT_SECONDS = int(os.environ.get('VIDEO_SPLIT_SECONDS', 120))
+
+#Encoding ladder: per rendition preset, crf (or bitrate) and maxrate/bufsize in kbit/s
+VIDEO_ENCODING_PROFILES = {
+    '480p': {'height': 480, 'field': 'video_480p', 'preset': 'veryfast', 'crf': 23, 'maxrate': '1400k', 'bufsize': '2800k'},
+    '720p': {'height': 720, 'field': 'video_720p', 'preset': 'medium', 'crf': 23, 'maxrate': '3000k', 'bufsize': '6000k'},
+    '1080p': {'height': 1080, 'field': 'video_1080p', 'preset': 'medium', 'crf': 22, 'maxrate': '6000k', 'bufsize': '12000k'},
+}
+#libx264, h264_nvenc, h264_qsv, h264_videotoolbox or auto (first available hardware encoder)
+VIDEO_ENCODER = os.environ.get('VIDEO_ENCODER', 'libx264')
+VIDEO_PER_TITLE_ENCODING = os.environ.get('VIDEO_PER_TITLE_ENCODING', 'False').lower() in ['true', '1', 'yes']
+
+#Adaptive streaming packaging (HLS always, DASH optional)
+VIDEO_SEGMENT_SECONDS = 6
+VIDEO_PACKAGE_DASH = os.environ.get('VIDEO_PACKAGE_DASH', 'False').lower() in ['true', '1', 'yes']
+
+#Scrub previews: one frame every VIDEO_PREVIEW_INTERVAL seconds, tiles of VIDEO_PREVIEW_WIDTH pixels per sprite sheet of columns x rows
+VIDEO_PREVIEW_INTERVAL = int(os.environ.get('VIDEO_PREVIEW_INTERVAL', 10))
+VIDEO_PREVIEW_WIDTH = 160
+VIDEO_PREVIEW_COLUMNS = 10
+VIDEO_PREVIEW_ROWS = 10
+#Poster variants generated from the thumbnail
+VIDEO_POSTER_WIDTHS = [320, 640, 1280]
+VIDEO_POSTER_FORMATS = ['avif', 'webp', 'jpeg']
+
+#Video streaming offload: empty, x-accel-redirect (nginx), x-sendfile or redirect (signed URL of the object store)
+VIDEO_STREAM_OFFLOAD = os.environ.get('VIDEO_STREAM_OFFLOAD', '')
+VIDEO_STREAM_ACCEL_PREFIX = '/protected-media/'
+
+#Watch progress heartbeats: buffer in Redis and flush to the database every x seconds
+VIDEO_PROGRESS_BUFFERED = os.environ.get('VIDEO_PROGRESS_BUFFERED', 'False').lower() in ['true', '1', 'yes']
+VIDEO_PROGRESS_FLUSH_INTERVAL = 30
+
+#Search: number of results of /api/video/search/ without `limit`
+VIDEO_SEARCH_LIMIT = 20
+
+#Resumable uploads: largest accepted chunk in bytes, timeout in seconds of the job which joins the chunks
+VIDEO_UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+VIDEO_UPLOAD_ASSEMBLY_TIMEOUT = 60 * 60
+
+#Media garbage collection: deleted files are removed by a maintenance job x seconds after the delete, in batches
+VIDEO_MEDIA_GC_DELAY = int(os.environ.get('VIDEO_MEDIA_GC_DELAY', 60))
+VIDEO_MEDIA_GC_BATCH_SIZE = 100
+
+RQ_CONNECTION = {
+    'HOST': os.environ.get('RQ_DEFAULT_HOST', 'localhost'),
+    'PORT': os.environ.get('RQ_DEFAULT_PORT', 6379),
+    'DB': os.environ.get('RQ_DEFAULT_DB', 0),
+    #'USERNAME': '',
+    'PASSWORD': os.environ.get('RQ_DEFAULT_PASSWORD', None),
+}
+
+#Transcode jobs get a timeout scaled with the media duration, the queue timeouts only apply to the other jobs.
+#Start the workers with the queues in priority order, e.g.
+#python manage.py rqworker transcode-high default transcode-bulk --with-scheduler
+#python manage.py rqworker email maintenance --with-scheduler
 RQ_QUEUES = {
-    'default': {
-        'HOST': os.environ.get('RQ_DEFAULT_HOST', 'localhost'),
-        'PORT': os.environ.get('RQ_DEFAULT_PORT', 6379),
-        'DB': os.environ.get('RQ_DEFAULT_DB', 0),
-        #'USERNAME': '',
-        'PASSWORD': os.environ.get('RQ_DEFAULT_PASSWORD', None),
-        'DEFAULT_TIMEOUT': os.environ.get('RQ_DEFAULT_TIMEOUT', 360),
-    },
+    'transcode-high': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': os.environ.get('RQ_DEFAULT_TIMEOUT', 360)},
+    'default': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': os.environ.get('RQ_DEFAULT_TIMEOUT', 360)},
+    'transcode-bulk': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': os.environ.get('RQ_DEFAULT_TIMEOUT', 360)},
+    'email': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': 60},
+    'maintenance': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': 600},
 }
 
+#Uploads up to this duration go to the high priority queue
+VIDEO_SHORT_UPLOAD_SECONDS = int(os.environ.get('VIDEO_SHORT_UPLOAD_SECONDS', 300))
+#Job timeout of an encode: seconds of work per second of media and rendition, at least VIDEO_TRANSCODE_MIN_TIMEOUT
+VIDEO_TRANSCODE_TIMEOUT_FACTOR = int(os.environ.get('VIDEO_TRANSCODE_TIMEOUT_FACTOR', 4))
+VIDEO_TRANSCODE_MIN_TIMEOUT = int(os.environ.get('VIDEO_TRANSCODE_MIN_TIMEOUT', 600))
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
@@ -185,6 +249,49 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+#Media storage: filesystem (MEDIA_ROOT), local-object (object store stand-in below MEDIA_ROOT without local paths)
+#or s3 (S3 compatible object store like AWS S3 or MinIO, needs django-storages and boto3)
+MEDIA_STORAGE = os.environ.get('MEDIA_STORAGE', 'filesystem')
+MEDIA_STORAGE_BACKENDS = {
+    'filesystem': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'local-object': {'BACKEND': 'videoflix_app.storage.LocalObjectStorage'},
+}
+if MEDIA_STORAGE == 's3':
+    from boto3.s3.transfer import TransferConfig
+
+    MEDIA_STORAGE_BACKENDS['s3'] = {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': os.environ.get('MEDIA_S3_BUCKET'),
+            'endpoint_url': os.environ.get('MEDIA_S3_ENDPOINT_URL') or None,
+            'region_name': os.environ.get('MEDIA_S3_REGION') or None,
+            'access_key': os.environ.get('MEDIA_S3_ACCESS_KEY'),
+            'secret_key': os.environ.get('MEDIA_S3_SECRET_KEY'),
+            'querystring_auth': True,
+            #Renditions are uploaded in parallel parts of 16 MB
+            'transfer_config': TransferConfig(multipart_threshold=16 * 1024 * 1024, multipart_chunksize=16 * 1024 * 1024, max_concurrency=8),
+        },
+    }
+    #HLS/DASH playlists and preview tracks point at their segments and sprites with relative URIs, which carry no
+    #signature. They are linked unsigned (through the CDN in MEDIA_S3_PUBLIC_DOMAIN if set), so the bucket or CDN
+    #must allow public reads below videos/hls/, videos/dash/ and videos/previews/
+    MEDIA_STORAGE_BACKENDS['s3-packages'] = {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            **MEDIA_STORAGE_BACKENDS['s3']['OPTIONS'],
+            'querystring_auth': False,
+            'custom_domain': os.environ.get('MEDIA_S3_PUBLIC_DOMAIN') or None,
+        },
+    }
+STORAGES = {
+    'default': MEDIA_STORAGE_BACKENDS[MEDIA_STORAGE],
+    'packages': MEDIA_STORAGE_BACKENDS.get(f'{MEDIA_STORAGE}-packages', MEDIA_STORAGE_BACKENDS[MEDIA_STORAGE]),
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+#Local scratch space of the workers (empty = system temp directory) and parallel uploads of packaged files
+VIDEO_WORK_DIR = os.environ.get('VIDEO_WORK_DIR', '')
+MEDIA_UPLOAD_CONCURRENCY = int(os.environ.get('MEDIA_UPLOAD_CONCURRENCY', 8))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -198,12 +305,32 @@ EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
 EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'False').lower() in ['true', '1', 'yes']
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+#Outbox: emails per batch, delivery attempts and the first retry delay in seconds (doubled per attempt)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 50))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.environ.get('EMAIL_OUTBOX_RETRY_DELAY', 60))
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAdminUser',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
-}
\ No newline at end of file
+    #Login attempts per client IP and per account, counted in Redis
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.environ.get('LOGIN_RATE_IP', '20/min'),
+        'login_account': os.environ.get('LOGIN_RATE_ACCOUNT', '5/min'),
+    },
+    #Number of reverse proxies (nginx) in front of Django, so the client IP is taken from X-Forwarded-For
+    'NUM_PROXIES': int(os.environ['NUM_PROXIES']) if os.environ.get('NUM_PROXIES') else None,
+}
+
+#Seconds a token -> user lookup stays in the cache (removed earlier on logout, password reset and user changes)
+AUTH_TOKEN_CACHE_TTL = 300
+#Auth tokens expire AUTH_TOKEN_TTL seconds after their last use, the expiry is moved forward at most once per refresh interval
+AUTH_TOKEN_TTL = int(os.environ.get('AUTH_TOKEN_TTL', 60 * 60 * 24 * 14))
+AUTH_TOKEN_REFRESH_INTERVAL = 60 * 60 * 24
+#Expired tokens are deleted by a job on the maintenance queue every x seconds, in batches
+AUTH_TOKEN_CLEANUP_INTERVAL = 60 * 60
+AUTH_TOKEN_CLEANUP_BATCH_SIZE = 1000
\ No newline at end of file
@@ -18,7 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from users.api.views import RegistrationView, UsersView, VerifyEmailView, PasswordResetRequest, PasswordResetConfirm, LoginView, TokenCheckView
+from users.api.views import RegistrationView, UsersView, VerifyEmailView, PasswordResetRequest, PasswordResetConfirm, LoginView, LogoutView, LogoutAllView, TokenCheckView, TokenRefreshView
 
 
 urlpatterns = [
@@ -27,11 +27,14 @@ urlpatterns = [
     path('api/', include('videoflix_app.api.urls')),
     path('api/registration/', RegistrationView.as_view(), name='registration'),
     path('api/login/', LoginView.as_view(), name='login'),
+    path('api/logout/', LogoutView.as_view(), name='logout'),
+    path('api/logout-all/', LogoutAllView.as_view(), name='logout-all'),
     path('api/verify-email/', VerifyEmailView.as_view(), name='verify-email'),
     path('api/users/', UsersView.as_view(), name='users'),
     path('api/password-reset/', PasswordResetRequest.as_view(), name='password-reset-request'),
     path('api/password-reset-confirm/', PasswordResetConfirm.as_view(), name='password-reset-confirm'),
     path('api/token-check/', TokenCheckView.as_view(), name='token-check'),
+    path('api/token-refresh/', TokenRefreshView.as_view(), name='token-refresh'),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,5 +1,6 @@
-from django.contrib import admin
-from .models import Video, VideoProgress
+from django.contrib import admin, messages
+from .models import Category, MediaTombstone, Video, VideoProgress, VideoUpload
+from .signals import enqueue_conversion
 from import_export.admin import ImportExportModelAdmin
 from import_export import resources
 
@@ -8,11 +9,32 @@ class VideoResource(resources.ModelResource):
     
     class Meta:
         model = Video
+        exclude = ['search_vector']
 
 @admin.register(Video)
 class VideoAdmin(ImportExportModelAdmin):
     resource_class = VideoResource
     list_display = ['title', 'description', 'created_at', 'video_480p']
-    list_filter = ['title', 'created_at']
+    list_filter = ['title', 'created_at', 'category']
+    actions = ['reencode_videos']
 
-admin.site.register(VideoProgress)
\ No newline at end of file
+    @admin.action(description='Re-encode selected videos (high priority)')
+    def reencode_videos(self, request, queryset):
+        """
+        Enqueues the conversion of the selected videos on the high priority queue again,
+        e.g. after a failed conversion. Only videos which still have their original file can be re-encoded.
+        """
+        videos = queryset.exclude(original_file='').exclude(original_file__isnull=True)
+        for video in videos:
+            enqueue_conversion(video.pk, 'high')
+        self.message_user(request, f'{len(videos)} of {queryset.count()} videos enqueued for re-encoding.', messages.INFO)
+
+admin.site.register(Category)
+admin.site.register(VideoProgress)
+admin.site.register(VideoUpload)
+
+
+@admin.register(MediaTombstone)
+class MediaTombstoneAdmin(admin.ModelAdmin):
+    list_display = ['name', 'is_prefix', 'attempts', 'next_attempt_at', 'last_error']
+    list_filter = ['is_prefix']
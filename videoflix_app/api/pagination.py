@@ -0,0 +1,19 @@
+from rest_framework.pagination import CursorPagination
+
+
+class VideoCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the video catalogue, newest videos first.
+
+    Pagination is opt-in: clients which send neither `cursor` nor `page_size` still get
+    the plain list of all videos.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params and self.page_size_query_param not in request.query_params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
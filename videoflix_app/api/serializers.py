@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from videoflix_app.models import Video, VideoProgress
+from videoflix_app.models import Video, VideoProgress, VideoUpload
 
 class VideoSerializer(serializers.ModelSerializer):
     """
@@ -7,13 +7,41 @@ class VideoSerializer(serializers.ModelSerializer):
 
     This serializer handles the conversion between the `Video` model and JSON representation, including
     validation and serialization of fields. It also handles file upload for video files.
+    The generated poster variants are returned as `srcset` strings per image format.
     """
     original_file = serializers.FileField(write_only=True)
+    category = serializers.SlugRelatedField(slug_field='name', read_only=True)
+    poster_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Video
-        fields = ['id', 'title', 'description', 'created_at', 'video_480p', 'video_720p', 'video_1080p', 'thumbnail', 'category', 'original_file']
-        read_only_fields = ['video_480p', 'video_720p', 'video_1080p', 'category']
+        fields = [
+            'id', 'title', 'description', 'created_at', 'video_480p', 'video_720p', 'video_1080p', 'hls_playlist', 'dash_manifest',
+            'preview_track', 'thumbnail', 'poster_srcset', 'category', 'original_file', 'duration', 'width', 'height', 'video_codec', 'bitrate', 'frame_rate',
+            'audio_channels', 'audio_layout',
+        ]
+        read_only_fields = [
+            'video_480p', 'video_720p', 'video_1080p', 'hls_playlist', 'dash_manifest', 'preview_track', 'category', 'duration', 'width',
+            'height', 'video_codec', 'bitrate', 'frame_rate', 'audio_channels', 'audio_layout',
+        ]
+
+    def get_poster_srcset(self, obj):
+        """
+        Returns the poster variants as {format: 'url 320w, url 640w, ...'}, ready for the
+        `srcset` of a `<source>` element.
+        """
+        request = self.context.get('request')
+        storage = Video._meta.get_field('thumbnail').storage
+        srcset = {}
+        for image_format, variants in obj.poster_variants.items():
+            if image_format == 'source':
+                continue
+            urls = []
+            for width, name in sorted(variants.items(), key=lambda variant: int(variant[0])):
+                url = storage.url(name)
+                urls.append(f'{request.build_absolute_uri(url) if request else url} {width}w')
+            srcset[image_format] = ', '.join(urls)
+        return srcset
 
 
 class VideoProgressSerializer(serializers.ModelSerializer):
@@ -22,9 +50,46 @@ class VideoProgressSerializer(serializers.ModelSerializer):
 
     This serializer handles the conversion between the `VideoProgress` model and JSON representation, 
     focusing on tracking a user's progress in watching a video. It serializes data such as the user, 
-    video name, and current watch time.
+    video, and current watch time.
     """
     class Meta:
         model = VideoProgress
-        fields = ['id', 'user', 'video_name', 'current_time']
+        fields = ['id', 'user', 'video', 'current_time']
         read_only_fields = ['user']
+
+
+
+class ContinueWatchingSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the "continue watching" list.
+
+    It combines the progress of the user with the metadata of the video and the
+    percentage of the video which has already been watched.
+    """
+    video = VideoSerializer(read_only=True)
+    percent_watched = serializers.FloatField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = VideoProgress
+        fields = ['video', 'current_time', 'percent_watched', 'updated_at']
+
+
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the VideoUpload model.
+
+    It creates a resumable upload from the metadata of the video (file name, total size, title,
+    description and an optional thumbnail) and reports the current offset and state of the upload.
+    """
+    state = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = VideoUpload
+        fields = ['id', 'filename', 'size', 'offset', 'state', 'title', 'description', 'thumbnail', 'video', 'created_at']
+        read_only_fields = ['offset', 'video']
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('The file size must be greater than 0.')
+        return value
@@ -1,16 +1,26 @@
-from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache import cache
 from rest_framework.decorators import action
-from django.conf import settings
 from rest_framework import viewsets
-from videoflix_app.models import Video, VideoProgress
-from .serializers import VideoSerializer, VideoProgressSerializer
+from videoflix_app.models import Category, Video, VideoProgress, VideoUpload
+from .serializers import VideoSerializer, VideoProgressSerializer, ContinueWatchingSerializer, VideoUploadSerializer
+from rest_framework import mixins
+from django.db import transaction
+from videoflix_app.processing import get_processing_status
+from videoflix_app.uploads import UPLOAD_MAX_CHUNK_SIZE, ChecksumMismatch, append_chunk, discard_upload, schedule_assembly
+from django.db.models import Case, Count, F, FloatField, Value, When
+from django.db.models.functions import Least
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.exceptions import NotAuthenticated
-
-
-CACHE_TTL = getattr(settings, 'CACHE_TTL', DEFAULT_TIMEOUT)
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from videoflix_app.streaming import serve_file
+from videoflix_app.encoding import ENCODING_PROFILES
+from videoflix_app.search import SEARCH_LIMIT, SEARCH_MAX_LIMIT, search_videos
+from videoflix_app.cache import CACHE_TTL, catalogue_cache_key
+from videoflix_app.progress import PROGRESS_BUFFERED, CONTINUE_WATCHING_TTL, save_progress, buffer_progress, buffered_progress, continue_watching_cache_key
+from .pagination import VideoCursorPagination
 
 
 class VideoViewSet(viewsets.ModelViewSet):
@@ -20,10 +30,16 @@ class VideoViewSet(viewsets.ModelViewSet):
     This viewset provides CRUD operations (Create, Read, Update, Delete) for the `Video` model. It includes
     actions for listing all videos, retrieving individual videos, and deleting videos. It ensures that only
     authenticated users can perform these actions.
+
+    The responses of `list` and `retrieve` are cached in Redis. The cache is versioned and
+    invalidated by the signal handlers whenever a video is saved or deleted.
+
+    The list can be filtered with `?category=<name>`, which is served by the (category, created_at) index.
     """
-    queryset = Video.objects.all()
+    queryset = Video.objects.select_related('category').defer('search_vector')
     serializer_class = VideoSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = VideoCursorPagination
 
     def get_permissions(self):
         """
@@ -35,24 +51,116 @@ class VideoViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsAdminUser()]
         return super().get_permissions()
 
-    #@method_decorator(cache_page(CACHE_TTL))
+    def get_queryset(self):
+        """
+        Returns the videos, filtered by the `category` query parameter if it is given.
+        """
+        queryset = super().get_queryset()
+        category = self.request.query_params.get('category')
+        if category:
+            queryset = queryset.filter(category__name=category)
+        return queryset
+
     def list(self, request, *args, **kwargs):
-        queryset = Video.objects.all()
-        serializer = VideoSerializer(queryset, many=True)
-        return Response(serializer.data)
+        """
+        Lists all videos. With `cursor` or `page_size` in the query string the list is cursor paginated.
+        """
+        cache_key = catalogue_cache_key('list', request.build_absolute_uri())
+        data = cache.get(cache_key)
+        if data is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                data = self.get_paginated_response(VideoSerializer(page, many=True).data).data
+            else:
+                data = VideoSerializer(queryset, many=True).data
+            cache.set(cache_key, data, CACHE_TTL)
+        return Response(data)
 
 
-    #@method_decorator(cache_page(CACHE_TTL))
     def retrieve(self, request, pk=None):
-        video = Video.objects.get(pk=pk)
-        serializer = VideoSerializer(video)
-        return Response(serializer.data)
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise Http404('Video not found.')
+        cache_key = catalogue_cache_key('detail', pk)
+        data = cache.get(cache_key)
+        if data is None:
+            video = get_object_or_404(Video.objects.select_related('category'), pk=pk)
+            data = VideoSerializer(video).data
+            cache.set(cache_key, data, CACHE_TTL)
+        return Response(data)
     
 
     def destroy(self, request, pk=None):
         video = Video.objects.get(pk=pk)
         video.delete()
         return Response({'message': 'Video deleted'}, status=204)
+
+
+    @action(detail=False, methods=['get'])
+    def categories(self, request):
+        """
+        Returns every category with its number of videos, counted in one grouped query, e.g.
+        `[{"name": "crime", "count": 12}, ...]`. The response is cached like the list.
+        """
+        cache_key = catalogue_cache_key('categories', '')
+        data = cache.get(cache_key)
+        if data is None:
+            data = list(Category.objects.annotate(count=Count('videos')).values('name', 'count').order_by('name'))
+            cache.set(cache_key, data, CACHE_TTL)
+        return Response(data)
+
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Searches title and description, e.g. `/api/video/search/?q=giant oce`, and returns the
+        best `limit` matches (default `VIDEO_SEARCH_LIMIT`, at most 100), most relevant first.
+        Supports prefix matching for type-ahead and tolerates typos in titles (see `search_videos`).
+        The results are cached like the list until the catalogue changes.
+        """
+        text = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', SEARCH_LIMIT)), SEARCH_MAX_LIMIT)
+        except ValueError:
+            return Response({'limit': 'A valid integer is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = catalogue_cache_key('search', f'{limit}:{text.lower()}')
+        data = cache.get(cache_key)
+        if data is None:
+            data = VideoSerializer(search_videos(self.get_queryset(), text)[:max(limit, 0)], many=True).data
+            cache.set(cache_key, data, CACHE_TTL)
+        return Response(data)
+
+
+    @action(detail=True, methods=['get'], url_path='processing-status')
+    def processing_status(self, request, pk=None):
+        """
+        Returns the processing status of a video: state, percent done, current rendition,
+        encoding speed (fps and x-realtime) and the estimated remaining seconds.
+        """
+        video = get_object_or_404(Video, pk=pk)
+        data = get_processing_status(video.pk)
+        if data is None:
+            converted = any(getattr(video, config['field']) for config in ENCODING_PROFILES.values())
+            data = {'state': 'done', 'percent': 100.0} if converted else {'state': 'unknown', 'percent': None}
+        return Response(data)
+
+
+    @action(detail=True, methods=['get'], url_path=r'stream/(?P<resolution>\d+p)')
+    def stream(self, request, pk=None, resolution=None):
+        """
+        Streams one rendition of a video with support for byte ranges (seeking) and
+        conditional requests. Uses the same token authentication as the other actions.
+        """
+        if resolution not in ENCODING_PROFILES:
+            raise Http404('Unknown resolution.')
+        video = get_object_or_404(Video, pk=pk)
+        video_field = getattr(video, ENCODING_PROFILES[resolution]['field'])
+        if not video_field or not video_field.name:
+            raise Http404('Rendition is not available.')
+        return serve_file(request, video_field.name)
     
 
 class VideoProgressViewSet(viewsets.ModelViewSet):
@@ -62,10 +170,15 @@ class VideoProgressViewSet(viewsets.ModelViewSet):
     This viewset provides actions for tracking and retrieving a user's progress while watching videos.
     It allows users to get their progress on specific videos and store or update progress data.
     The `get_queryset` method filters the progress by the currently authenticated user.
+
+    Creating progress is an upsert: there is one row per user and video which gets updated
+    with a single `INSERT ... ON CONFLICT` query. Player heartbeats can go through the `heartbeat`
+    action, which buffers them in Redis when `VIDEO_PROGRESS_BUFFERED` is enabled.
     """
     serializer_class = VideoProgressSerializer
     queryset = VideoProgress.objects.all()
     permission_classes = [IsAuthenticated]
+    finished_percent = 95
 
     def get_queryset(self):
         user = self.request.user
@@ -76,15 +189,151 @@ class VideoProgressViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def get_user_progress(self, request):
-        video_name = request.query_params.get('video_name')
-        if not video_name:
-            return Response({'error': 'video_name is required'}, status=status.HTTP_400_BAD_REQUEST)
-        progress = self.get_queryset().filter(video_name=video_name).first()
+        video_id = request.query_params.get('video')
+        if not video_id or not video_id.isdigit():
+            return Response({'error': 'video is required'}, status=status.HTTP_400_BAD_REQUEST)
+        current_time = buffered_progress(request.user.id, int(video_id))
+        if current_time is not None:
+            return Response({'video': int(video_id), 'current_time': current_time}, status=status.HTTP_200_OK)
+        progress = self.get_queryset().filter(video_id=video_id).first()
         if progress:
             serializer = self.get_serializer(progress)
             return Response(serializer.data)
         else:
             return Response({'current_time': 0}, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['get'], url_path='continue-watching')
+    def continue_watching(self, request):
+        """
+        Returns the videos the user has started but not finished, most recently watched first,
+        together with the video metadata and the watched percentage.
+
+        The list is built with one query (progress joined with the videos, percentage computed
+        in the database) and cached per user until the user reports new progress.
+        """
+        cache_key = continue_watching_cache_key(request.user.id)
+        data = cache.get(cache_key)
+        if data is None:
+            queryset = (
+                self.get_queryset()
+                .filter(current_time__gt=0)
+                .select_related('video__category')
+                .annotate(percent_watched=Case(
+                    When(video__duration__gt=0, then=Least(F('current_time') * 100.0 / F('video__duration'), Value(100.0))),
+                    default=None,
+                    output_field=FloatField(),
+                ))
+                .exclude(percent_watched__gte=self.finished_percent)
+                .order_by('-updated_at')
+            )
+            data = ContinueWatchingSerializer(queryset, many=True).data
+            cache.set(cache_key, data, CONTINUE_WATCHING_TTL)
+        return Response(data)
+
+    def create(self, request, *args, **kwargs):
+        """
+        Creates or updates the progress of the current user for a video.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        progress, = save_progress([(
+            request.user.id, serializer.validated_data['video'].id, serializer.validated_data['current_time'],
+        )])
+        return Response(self.get_serializer(progress).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def heartbeat(self, request):
+        """
+        Receives the periodic position reports of the player. With `VIDEO_PROGRESS_BUFFERED`
+        the position is buffered in Redis and flushed to the database in batches.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        video_id = serializer.validated_data['video'].id
+        current_time = serializer.validated_data['current_time']
+        if PROGRESS_BUFFERED:
+            buffer_progress(request.user.id, video_id, current_time)
+            return Response({'video': video_id, 'current_time': current_time}, status=status.HTTP_202_ACCEPTED)
+        save_progress([(request.user.id, video_id, current_time)])
+        return Response({'video': video_id, 'current_time': current_time}, status=status.HTTP_200_OK)
+
+
+class VideoUploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    ViewSet for resumable uploads of original video files.
+
+    - POST creates an upload with the metadata of the video and returns its id.
+    - HEAD/GET return the current offset (also as `Upload-Offset` header), so a client can
+      resume after a network drop.
+    - PATCH appends a chunk. The request needs the `Upload-Offset` header with the current offset
+      and may send `Upload-Checksum` (`sha256 <base64 digest>`, also md5/sha1) to verify the chunk.
+      The chunk is streamed into the media storage.
+    - The final chunk is answered with 202 and the state `assembling`: an RQ job joins the chunks,
+      creates the `Video` and starts its conversion. Clients poll GET until the state is `completed`.
+    - DELETE cancels an unfinished upload.
+    """
+    serializer_class = VideoUploadSerializer
+    queryset = VideoUpload.objects.all()
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return VideoUpload.objects.filter(user=self.request.user)
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
\ No newline at end of file
+        serializer.save(user=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        upload = self.get_object()
+        response = Response(self.get_serializer(upload).data)
+        response['Upload-Offset'] = str(upload.offset)
+        response['Upload-Length'] = str(upload.size)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    def partial_update(self, request, *args, **kwargs):
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers.get('Content-Length') or 0)
+        except ValueError:
+            return Response({'error': 'Upload-Offset header is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if length > UPLOAD_MAX_CHUNK_SIZE:
+            return Response({'error': 'Chunk is too large.'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        with transaction.atomic():
+            upload = get_object_or_404(self.get_queryset().select_for_update(), pk=kwargs['pk'])
+            if upload.video_id:
+                return Response({'error': 'Upload is already completed.'}, status=status.HTTP_409_CONFLICT)
+            if upload.state == 'assembling':
+                return Response({'error': 'Upload is being assembled.'}, status=status.HTTP_409_CONFLICT)
+            if offset != upload.offset:
+                response = Response({'error': 'Upload-Offset does not match.', 'offset': upload.offset}, status=status.HTTP_409_CONFLICT)
+                response['Upload-Offset'] = str(upload.offset)
+                return response
+
+            try:
+                append_chunk(upload, request.stream, length, request.headers.get('Upload-Checksum'))
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            except ChecksumMismatch:
+                # 460 Checksum Mismatch of the tus protocol.
+                return Response({'error': 'Checksum mismatch.', 'offset': upload.offset}, status=460)
+
+            if upload.state == 'assembling':
+                schedule_assembly(upload)
+
+        response_status = status.HTTP_202_ACCEPTED if upload.state == 'assembling' else status.HTTP_200_OK
+        response = Response(self.get_serializer(upload).data, status=response_status)
+        response['Upload-Offset'] = str(upload.offset)
+        return response
+
+    def destroy(self, request, *args, **kwargs):
+        if self.get_object().state == 'assembling':
+            return Response({'error': 'Upload is being assembled.'}, status=status.HTTP_409_CONFLICT)
+        return super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        if not instance.video_id:
+            discard_upload(instance)
+            if instance.thumbnail:
+                instance.thumbnail.delete(save=False)
+        instance.delete()
@@ -0,0 +1,38 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+CACHE_TTL = getattr(settings, 'CACHE_TTL', DEFAULT_TIMEOUT)
+CATALOGUE_VERSION_KEY = 'video-catalogue:version'
+
+
+def catalogue_version():
+    """
+    Returns the current version of the video catalogue. Every cached catalogue response
+    contains this version in its key, so bumping it invalidates all of them at once.
+    """
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOGUE_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOGUE_VERSION_KEY, 1)
+    return version
+
+
+def catalogue_cache_key(kind, identifier):
+    """
+    Builds the versioned cache key of a catalogue response (`list` or `detail`).
+    """
+    digest = hashlib.md5(str(identifier).encode()).hexdigest()
+    return f'video-catalogue:{catalogue_version()}:{kind}:{digest}'
+
+
+def invalidate_catalogue():
+    """
+    Invalidates all cached catalogue responses by bumping the catalogue version.
+    """
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOGUE_VERSION_KEY, 1, timeout=None)
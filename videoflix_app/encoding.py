@@ -0,0 +1,334 @@
+import json
+import os
+import subprocess
+import tempfile
+from functools import lru_cache
+from django.conf import settings
+
+
+ENCODING_PROFILES = getattr(settings, 'VIDEO_ENCODING_PROFILES', {
+    "480p": {"height": 480, "field": "video_480p", "preset": "medium", "crf": 23},
+    "720p": {"height": 720, "field": "video_720p", "preset": "medium", "crf": 23},
+    "1080p": {"height": 1080, "field": "video_1080p", "preset": "medium", "crf": 23},
+})
+MEDIA_FIELDS = ['duration', 'width', 'height', 'video_codec', 'bitrate', 'frame_rate', 'audio_channels', 'audio_layout']
+VIDEO_ENCODER = getattr(settings, 'VIDEO_ENCODER', 'libx264')
+PER_TITLE_ENCODING = getattr(settings, 'VIDEO_PER_TITLE_ENCODING', False)
+SEGMENT_SECONDS = getattr(settings, 'VIDEO_SEGMENT_SECONDS', 6)
+SPLIT_SECONDS = getattr(settings, 'VIDEO_SPLIT_SECONDS', 120)
+
+HARDWARE_ENCODERS = ['h264_nvenc', 'h264_qsv', 'h264_videotoolbox']
+NVENC_PRESETS = {
+    'ultrafast': 'p1', 'superfast': 'p1', 'veryfast': 'p2', 'faster': 'p3', 'fast': 'p3',
+    'medium': 'p4', 'slow': 'p5', 'slower': 'p6', 'veryslow': 'p7',
+}
+
+COMPLEXITY_SAMPLES = 3
+COMPLEXITY_SAMPLE_SECONDS = 4
+# Upper bitrate limit (kbit/s) of a 480p probe encode per complexity class, with the CRF offset
+# and the factor for maxrate/bufsize which the class applies to every profile.
+COMPLEXITY_CLASSES = [
+    (700, 'low', 3, 0.7),
+    (1800, 'medium', 0, 1.0),
+    (None, 'high', -2, 1.3),
+]
+
+
+@lru_cache(maxsize=1)
+def detect_encoder():
+    """
+    Returns the H.264 encoder to use. With `VIDEO_ENCODER = 'auto'` the first hardware encoder
+    which the installed ffmpeg offers is used, otherwise `libx264`.
+    """
+    if VIDEO_ENCODER != 'auto':
+        return VIDEO_ENCODER
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True)
+    for encoder in HARDWARE_ENCODERS:
+        if encoder in result.stdout:
+            return encoder
+    return 'libx264'
+
+
+def encoder_args(profile):
+    """
+    Returns the encoder arguments of one rendition profile.
+
+    - `preset`, `crf` (or `bitrate` for a target bitrate), `maxrate` and `bufsize` are taken
+      from the profile and translated to the options of the selected (hardware) encoder.
+    - Keyframes are forced at every segment boundary, so all renditions can later be cut
+      into aligned HLS/DASH segments.
+    """
+    encoder = detect_encoder()
+    preset = profile.get('preset', 'medium')
+    args = ['-c:v', encoder]
+
+    if encoder == 'h264_nvenc':
+        args += ['-preset', NVENC_PRESETS.get(preset, 'p4')]
+    elif encoder == 'libx264':
+        args += ['-preset', preset]
+
+    if profile.get('bitrate'):
+        args += ['-b:v', profile['bitrate']]
+    elif encoder == 'h264_nvenc':
+        args += ['-rc', 'vbr', '-cq', str(profile.get('crf', 23))]
+    elif encoder == 'h264_qsv':
+        args += ['-global_quality', str(profile.get('crf', 23))]
+    elif encoder == 'h264_videotoolbox':
+        args += ['-q:v', str(max(1, 100 - 2 * profile.get('crf', 23)))]
+    else:
+        args += ['-crf', str(profile.get('crf', 23))]
+
+    if profile.get('maxrate'):
+        args += ['-maxrate', profile['maxrate'], '-bufsize', profile.get('bufsize', profile['maxrate'])]
+
+    return args + [
+        '-force_key_frames', f'expr:gte(t,n_forced*{SEGMENT_SECONDS})',
+        '-c:a', 'aac', '-b:a', profile.get('audio_bitrate', '128k'),
+    ]
+
+
+def parse_number(value, cast=float):
+    """
+    Converts an ffprobe value to a number. Returns None for missing or invalid values.
+    """
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_frame_rate(value):
+    """
+    Converts an ffprobe frame rate like `30000/1001` to frames per second.
+    """
+    numerator, _, denominator = (value or '').partition('/')
+    numerator, denominator = parse_number(numerator), parse_number(denominator or 1)
+    if not numerator or not denominator:
+        return None
+    return round(numerator / denominator, 3)
+
+
+def stream_rotation(stream):
+    """
+    Returns the display rotation of a video stream in degrees (phone recordings are often
+    stored landscape with a rotation of 90 degrees).
+    """
+    for side_data in stream.get('side_data_list', []):
+        if 'rotation' in side_data:
+            return parse_number(side_data['rotation'], int) or 0
+    return parse_number(stream.get('tags', {}).get('rotate'), int) or 0
+
+
+def parse_probe(data):
+    """
+    Extracts the media metadata stored on the `Video` model from the JSON output of ffprobe.
+    """
+    streams = data.get('streams', [])
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), {})
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), {})
+    media_format = data.get('format', {})
+
+    width, height = video.get('width'), video.get('height')
+    if abs(stream_rotation(video)) % 180 == 90:
+        width, height = height, width
+
+    return {
+        'duration': parse_number(media_format.get('duration') or video.get('duration')),
+        'width': width,
+        'height': height,
+        'video_codec': video.get('codec_name', ''),
+        'bitrate': parse_number(media_format.get('bit_rate') or video.get('bit_rate'), int),
+        'frame_rate': parse_frame_rate(video.get('avg_frame_rate') or video.get('r_frame_rate')),
+        'audio_channels': audio.get('channels'),
+        'audio_layout': audio.get('channel_layout', ''),
+    }
+
+
+def inspect_media(path):
+    """
+    Inspects a media file with ffprobe and returns duration, resolution, codec, bitrate,
+    frame rate and audio layout (see `MEDIA_FIELDS`).
+    """
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path],
+        capture_output=True, text=True, check=True,
+    )
+    return parse_probe(json.loads(result.stdout))
+
+
+def select_renditions(width, height, profiles=None):
+    """
+    Returns the renditions which do not need upscaling. The short side of the source decides,
+    so portrait videos are treated like landscape ones. If the source is smaller than every
+    rendition, only the smallest rendition is made (at the size of the source).
+    """
+    profiles = profiles or ENCODING_PROFILES
+    if not width or not height:
+        return list(profiles)
+    short_side = min(width, height)
+    renditions = [resolution for resolution, profile in profiles.items() if profile['height'] <= short_side]
+    return renditions or [min(profiles, key=lambda resolution: profiles[resolution]['height'])]
+
+
+def scale_filter(profile, width=None, height=None):
+    """
+    Returns the scale filter of a rendition. The aspect ratio of the source is kept; the short
+    side is scaled to the height of the profile, but never above the size of the source.
+    """
+    target = profile['height']
+    if width and height:
+        target = min(target, min(width, height))
+        target -= target % 2
+        if height > width:
+            return f'scale={target}:-2'
+    return f'scale=-2:{target}'
+
+
+def rendition_target(source, resolution):
+    """
+    Returns the temporary output path of a rendition next to the source file.
+    """
+    file, _ = os.path.splitext(source)
+    return file + f'_{resolution}.mp4'
+
+
+def build_rendition_command(source, resolution, profiles=None, width=None, height=None):
+    """
+    Builds the ffmpeg command which encodes exactly one rendition from the source file.
+    `width` and `height` of the source keep its aspect ratio and prevent upscaling.
+    """
+    profile = (profiles or ENCODING_PROFILES)[resolution]
+    return [
+        'ffmpeg', '-y', '-i', source,
+        '-vf', scale_filter(profile, width, height), *encoder_args(profile),
+        rendition_target(source, resolution),
+    ]
+
+
+def build_single_pass_command(source, resolutions, profiles=None, width=None, height=None):
+    """
+    Builds one ffmpeg command which decodes the source only once and writes all given
+    renditions through a `split` filter graph.
+
+    Every output gets its own scaled branch of the decoded video stream, the audio stream
+    (if any) is mapped into every output.
+    """
+    profiles = profiles or ENCODING_PROFILES
+    branches = ''.join(f'[s{index}]' for index in range(len(resolutions)))
+    filters = [f'[0:v]split={len(resolutions)}{branches}']
+    for index, resolution in enumerate(resolutions):
+        filters.append(f'[s{index}]{scale_filter(profiles[resolution], width, height)}[v{index}]')
+
+    cmd = ['ffmpeg', '-y', '-i', source, '-filter_complex', ';'.join(filters)]
+    for index, resolution in enumerate(resolutions):
+        cmd += [
+            '-map', f'[v{index}]', '-map', '0:a?', *encoder_args(profiles[resolution]),
+            rendition_target(source, resolution),
+        ]
+    return cmd
+
+
+def build_split_command(source, output_dir, split_seconds=None):
+    """
+    Builds the ffmpeg command which cuts the video stream of the source into pieces of about
+    `split_seconds` without re-encoding. With `-c copy` the segment muxer can only cut at
+    keyframes, so every piece starts with a keyframe and can be encoded on its own.
+    """
+    _, extension = os.path.splitext(source)
+    return [
+        'ffmpeg', '-y', '-i', source, '-map', '0:v:0', '-c', 'copy',
+        '-f', 'segment', '-segment_time', str(split_seconds or SPLIT_SECONDS), '-reset_timestamps', '1',
+        os.path.join(output_dir, f'part_%05d{extension}'),
+    ]
+
+
+def build_segment_command(segment, resolution, profiles=None, width=None, height=None):
+    """
+    Builds the ffmpeg command which encodes one rendition of one piece of the source.
+    The audio is left out; it is encoded once for the whole video when the pieces are joined.
+    """
+    cmd = build_rendition_command(segment, resolution, profiles, width, height)
+    return cmd[:-1] + ['-an', cmd[-1]]
+
+
+def build_concat_command(list_path, source, target, profile):
+    """
+    Builds the ffmpeg command which joins the encoded pieces of one rendition (listed in a
+    concat demuxer file) without re-encoding and adds the audio track of the source.
+    """
+    return [
+        'ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path, '-i', source,
+        '-map', '0:v', '-map', '1:a?', '-c:v', 'copy',
+        '-c:a', 'aac', '-b:a', profile.get('audio_bitrate', '128k'),
+        target,
+    ]
+
+
+def probe_bitrate(source, duration):
+    """
+    Encodes a few short samples of the source with a fixed, fast 480p setting and returns
+    the resulting average bitrate in kbit/s. The harder the content is to compress (motion,
+    grain, detail), the higher the bitrate at the same CRF.
+    """
+    sample_seconds = min(COMPLEXITY_SAMPLE_SECONDS, duration)
+    positions = [duration * (index + 1) / (COMPLEXITY_SAMPLES + 1) - sample_seconds / 2 for index in range(COMPLEXITY_SAMPLES)]
+    total_bytes = 0
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for index, position in enumerate(positions):
+            target = os.path.join(tmp_dir, f'sample_{index}.mp4')
+            subprocess.run([
+                'ffmpeg', '-y', '-ss', str(max(position, 0)), '-t', str(sample_seconds), '-i', source,
+                '-an', '-vf', 'scale=-2:480', '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '23', target,
+            ], capture_output=True, check=True)
+            total_bytes += os.path.getsize(target)
+
+    return total_bytes * 8 / 1000 / (sample_seconds * len(positions))
+
+
+def classify_complexity(bitrate):
+    """
+    Maps the probe bitrate to a complexity class (`low`, `medium` or `high`).
+    """
+    for limit, complexity, _, _ in COMPLEXITY_CLASSES:
+        if limit is None or bitrate <= limit:
+            return complexity
+
+
+def adjust_profiles(complexity, profiles=None):
+    """
+    Returns a copy of the encoding profiles adjusted to the complexity of a title: easy content
+    gets a higher CRF and lower rate caps, hard content a lower CRF and higher rate caps.
+    """
+    profiles = profiles or ENCODING_PROFILES
+    if complexity is None:
+        return profiles
+
+    crf_offset, rate_factor = next((offset, factor) for _, name, offset, factor in COMPLEXITY_CLASSES if name == complexity)
+    adjusted = {}
+    for resolution, profile in profiles.items():
+        profile = dict(profile)
+        if 'crf' in profile:
+            profile['crf'] = profile['crf'] + crf_offset
+        for key in ['bitrate', 'maxrate', 'bufsize']:
+            if profile.get(key):
+                profile[key] = f'{int(int(profile[key].rstrip("k")) * rate_factor)}k'
+        adjusted[resolution] = profile
+    return adjusted
+
+
+def analyze_complexity(source, duration):
+    """
+    Runs the optional per-title analysis (`VIDEO_PER_TITLE_ENCODING`) and returns the
+    complexity class of the source or None if the analysis is disabled or not possible.
+    """
+    if not PER_TITLE_ENCODING or not duration:
+        return None
+    try:
+        bitrate = probe_bitrate(source, duration)
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f'Komplexitätsanalyse fehlgeschlagen: {str(e)}')
+        return None
+    complexity = classify_complexity(bitrate)
+    print(f'Komplexität: {complexity} ({bitrate:.0f} kbit/s)')
+    return complexity
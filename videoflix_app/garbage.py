@@ -0,0 +1,83 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from .models import MediaTombstone, Video
+from .queues import MAINTENANCE, get_queue
+from .storage import delete_prefix, media_prefix
+
+
+MEDIA_GC_DELAY = getattr(settings, 'VIDEO_MEDIA_GC_DELAY', 60)
+MEDIA_GC_BATCH_SIZE = getattr(settings, 'VIDEO_MEDIA_GC_BATCH_SIZE', 100)
+MEDIA_GC_MAX_RETRY_DELAY = 60 * 60 * 24
+MEDIA_GC_SCHEDULED_KEY = 'media-gc:scheduled'
+MEDIA_FILE_FIELDS = ['original_file', 'video_480p', 'video_720p', 'video_1080p', 'thumbnail']
+MEDIA_KINDS = ['hls', 'dash', 'previews', 'posters', 'segments']
+
+
+def video_media(video):
+    """
+    Returns the stored files of a video as (names, prefixes): the file fields and the
+    directories of the generated media (HLS/DASH packages, previews, posters, segment pieces).
+    """
+    names = [getattr(video, field).name for field in MEDIA_FILE_FIELDS if getattr(video, field)]
+    prefixes = [media_prefix(kind, video.pk) for kind in MEDIA_KINDS]
+    return names, prefixes
+
+
+def bury(names=(), prefixes=()):
+    """
+    Writes tombstones for stored files and prefixes in the current transaction and makes sure
+    the garbage collection job runs once it has been committed. If the transaction is rolled
+    back, the tombstones are gone as well and the files are kept.
+    """
+    tombstones = MediaTombstone.objects.bulk_create(
+        [MediaTombstone(name=name) for name in names]
+        + [MediaTombstone(name=prefix, is_prefix=True) for prefix in prefixes]
+    )
+    transaction.on_commit(schedule_media_gc)
+    return tombstones
+
+
+def schedule_media_gc(delay=None):
+    """
+    Schedules the garbage collection job on the `maintenance` queue, `VIDEO_MEDIA_GC_DELAY` seconds
+    from now by default. Deleting many videos at once only schedules one job, which deletes all of
+    their files in batches. Requires an RQ worker started with `--with-scheduler`.
+    """
+    from .tasks import collect_media_garbage
+    queue = get_queue(MAINTENANCE)
+    if delay is not None:
+        queue.enqueue_in(delay, collect_media_garbage)
+    elif cache.add(MEDIA_GC_SCHEDULED_KEY, True, timeout=MEDIA_GC_DELAY):
+        queue.enqueue_in(timedelta(seconds=MEDIA_GC_DELAY), collect_media_garbage)
+
+
+def retry_delay(attempts):
+    """
+    Returns the backoff before the next attempt to delete a file: `VIDEO_MEDIA_GC_DELAY` seconds,
+    doubled with every failed attempt, at most one day.
+    """
+    return timedelta(seconds=min(MEDIA_GC_DELAY * 2 ** (attempts - 1), MEDIA_GC_MAX_RETRY_DELAY))
+
+
+def referenced_names(names):
+    """
+    Returns those of the given names which are (again) referenced by a video, e.g. because an
+    upload reused the name after the tombstone was written. These files must not be deleted.
+    """
+    referenced = set()
+    for field in MEDIA_FILE_FIELDS:
+        referenced.update(Video.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+    return referenced
+
+
+def delete_media(tombstone):
+    """
+    Deletes the file or prefix of a tombstone from the media storage.
+    """
+    if tombstone.is_prefix:
+        delete_prefix(tombstone.name)
+    elif default_storage.exists(tombstone.name):
+        default_storage.delete(tombstone.name)
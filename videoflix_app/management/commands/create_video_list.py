@@ -1,8 +1,16 @@
 # yourapp/management/commands/upload_videos.py
+import csv
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files.storage import default_storage
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from videoflix_app.cache import invalidate_catalogue
+from videoflix_app.encoding import inspect_media
 from videoflix_app.models import Video
-from django.core.files import File
+from videoflix_app.signals import enqueue_bulk_conversions
+from videoflix_app.storage import import_file
 
 
 # Die vordefinierten Titel und Beschreibungen der Videos, basierend auf den Dateinamen
@@ -65,51 +73,103 @@ class Command(BaseCommand):
     from a specified folder into the `Video` model in the Django application.
 
     The command reads video files and their corresponding metadata (such as title, description, and thumbnail name) 
-    from a directory specified by the environment variable `VIDEO_FOLDER`. It then creates `Video` model instances 
-    and stores the video files and thumbnails in the appropriate fields.
+    from a directory specified by `--folder` or the environment variable `VIDEO_FOLDER`. The metadata comes from
+    a manifest (`--manifest`, CSV or JSON) or from `VIDEO_METADATA`. The files are probed and imported in parallel
+    (hardlinked if the folder and the media storage share a filesystem), the `Video` rows are created with
+    `bulk_create` and the conversions are routed to the `transcode-bulk` queue, so imports do not hold up
+    regular uploads. At most `--concurrency` conversions of the import run at the same time.
+
+    A CSV manifest has the columns `file`, `title`, `description` and `thumbnail`. A JSON manifest is a list of
+    such objects or, like `VIDEO_METADATA`, an object keyed by file name.
 
     Usage:
-        python manage.py upload_videos
+        python manage.py create_video_list [--manifest videos.csv] [--folder /path/to/videos]
     """
     help = 'Uploads videos from a specified folder into the Video model'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--manifest', help='CSV or JSON file with the metadata of the videos.')
+        parser.add_argument('--folder', help='Folder of the video and thumbnail files (default: VIDEO_FOLDER or the folder of the manifest).')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of files probed and imported in parallel.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of rows per INSERT.')
+        parser.add_argument('--concurrency', type=int, default=4, help='Maximum number of conversions of the import running at the same time.')
+
+    def handle(self, *args, **options):
         """
-        Main handler for the `upload_videos` command.
+        Main handler for the `create_video_list` command.
         
-        It processes all video files in the specified video folder, extracts their 
-        metadata, and uploads them to the database as instances of the `Video` model.
+        It processes all listed video files, extracts their media metadata, imports them into the media storage
+        and creates the `Video` instances in batches. The conversions are enqueued once the rows are committed.
+        """
+        manifest = options['manifest']
+        video_folder = options['folder'] or os.environ.get('VIDEO_FOLDER') or os.path.dirname(os.path.abspath(manifest or '.'))
+        entries = self.read_manifest(manifest) if manifest else self.folder_entries(video_folder)
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            videos = [video for video in executor.map(lambda entry: self.prepare_video(video_folder, entry), entries) if video]
+
+        with transaction.atomic():
+            videos = Video.objects.bulk_create(videos, batch_size=options['batch_size'])
+            transaction.on_commit(lambda: enqueue_bulk_conversions(videos, options['concurrency']))
+        invalidate_catalogue()
+        self.stdout.write(self.style.SUCCESS(f'Successfully uploaded {len(videos)} of {len(entries)} videos.'))
+
+    def read_manifest(self, manifest):
+        """
+        Reads the entries (`file`, `title`, `description`, `thumbnail`) of a CSV or JSON manifest.
+        """
+        with open(manifest, newline='', encoding='utf-8') as f:
+            if manifest.lower().endswith('.json'):
+                data = json.load(f)
+                if isinstance(data, dict):
+                    return [{'file': file_name, **metadata} for file_name, metadata in data.items()]
+                return data
+            return list(csv.DictReader(f))
+
+    def folder_entries(self, video_folder):
+        """
+        Returns the entries of `VIDEO_METADATA` for the video files in the folder (matched case-insensitively).
+        """
+        metadata = {file_name.lower(): value for file_name, value in VIDEO_METADATA.items()}
+        return [
+            {'file': file_name, **metadata[file_name.lower()]}
+            for file_name in os.listdir(video_folder)
+            if file_name.lower() in metadata and os.path.isfile(os.path.join(video_folder, file_name))
+        ]
+
+    def prepare_video(self, video_folder, entry):
+        """
+        Probes the video file of an entry, imports it and its thumbnail into the media storage
+        and returns the unsaved `Video`, or None if the entry has no file or the files are missing or unreadable.
+        """
+        file_name = entry.get('file')
+        if not file_name:
+            self.stdout.write(self.style.WARNING(f'No file given for entry {entry}. Skipped.'))
+            return None
+        video_title = entry.get('title') or file_name
+        video_path = os.path.join(video_folder, file_name)
+        thumbnail_name = entry.get('thumbnail')
+        thumbnail_path = os.path.join(video_folder, thumbnail_name) if thumbnail_name else None
+
+        if not os.path.isfile(video_path) or (thumbnail_path and not os.path.isfile(thumbnail_path)):
+            self.stdout.write(self.style.WARNING(f"File or Thumbnail not found for {file_name}. Video Path: {video_path}, Thumbnail Path: {thumbnail_path}"))
+            return None
+
+        try:
+            video = Video(title=video_title, description=entry.get('description', ''), **inspect_media(video_path))
+            video.original_file = self.import_media(video_path, 'original_file')
+            if thumbnail_path:
+                video.thumbnail = self.import_media(thumbnail_path, 'thumbnail')
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error uploading video {video_title}: {e}'))
+            return None
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully imported video: {video_title}.'))
+        return video
+
+    def import_media(self, path, field):
+        """
+        Imports a file into the `upload_to` folder of the given field of `Video`.
         """
-        video_folder = os.environ.get('VIDEO_FOLDER')
-        video_files = [f for f in os.listdir(video_folder) if os.path.isfile(os.path.join(video_folder, f))]
-
-        for video_file in video_files:
-            video_file_lower = video_file.lower()
-
-            if video_file.lower() in [key.lower() for key in VIDEO_METADATA]:
-                metadata = VIDEO_METADATA[video_file_lower]
-                video_title = metadata['title']
-                video_description = metadata['description']
-                video_thumbnail_name = metadata['thumbnail']
-                
-                video_path = os.path.join(video_folder, video_file)
-                thumbnail_path = os.path.join(video_folder, video_thumbnail_name)
-
-                if os.path.exists(video_path) and os.path.exists(thumbnail_path):
-                    try:
-
-                        with open(video_path, 'rb') as video_file_obj, open(thumbnail_path, 'rb') as thumbnail_file_obj:
-                            video = Video(
-                                title=video_title,
-                                description=video_description,
-                                original_file=File(video_file_obj, name=video_file)
-                            )
-
-                            video.thumbnail = File(thumbnail_file_obj, name=video_thumbnail_name)
-                            video.save()
-
-                        self.stdout.write(self.style.SUCCESS(f'Successfully uploaded video: {video_title} with thumbnail.'))
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f'Error uploading video {video_title}: {e}'))
-                else:
-                    self.stdout.write(self.style.WARNING(f"File or Thumbnail not found for {video_file}. Video Path: {video_path}, Thumbnail Path: {thumbnail_path}"))
\ No newline at end of file
+        upload_to = Video._meta.get_field(field).upload_to
+        return import_file(path, upload_to + default_storage.get_valid_name(os.path.basename(path)))
@@ -0,0 +1,114 @@
+import uuid
+from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from videoflix_app.garbage import MEDIA_FILE_FIELDS, MEDIA_KINDS, bury, referenced_names
+from videoflix_app.models import MediaTombstone, Video, VideoUpload
+from videoflix_app.storage import media_prefix
+from videoflix_app.uploads import chunk_prefix
+
+
+class Command(BaseCommand):
+    help = 'Finds files below videos/ in the media storage which no video references and optionally deletes them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Write tombstones for the orphaned files, so the garbage collection deletes them.')
+        parser.add_argument('--min-age', type=int, default=24, help='Only report files older than this many hours (default: 24).')
+        parser.add_argument('--prefix', default='videos', help='Storage prefix to check (default: videos).')
+
+    def handle(self, *args, **options):
+        """
+        Walks the media storage and compares it with the files referenced by `Video` rows.
+
+        - Files of the file fields of a video, the media directories of existing videos and the
+          chunks of open uploads are kept, as are files and directories which already have a tombstone.
+        - A media directory (`videos/hls/<id>` etc.) of a video which no longer exists is reported as a whole.
+        - Files and directories with files younger than `--min-age` hours are skipped, they may belong
+          to a running conversion or upload which has not saved its reference yet.
+        - Before the tombstones are written, the orphans are checked against the database again, so
+          videos, uploads and references created while the storage was listed are kept.
+        """
+        self.names, self.prefixes = self.referenced_media()
+        self.cutoff = timezone.now() - timedelta(hours=options['min_age'])
+        names, prefixes = [], []
+        for name, is_prefix in self.find_orphans(options['prefix'].rstrip('/')):
+            self.stdout.write(f'{name}/' if is_prefix else name)
+            (prefixes if is_prefix else names).append(name)
+
+        if options['delete'] and (names or prefixes):
+            with transaction.atomic():
+                names, prefixes = self.still_orphaned(names, prefixes)
+                bury(names, prefixes)
+            self.stdout.write(self.style.SUCCESS(f'{len(names) + len(prefixes)} orphans marked for deletion.'))
+        else:
+            self.stdout.write(f'{len(names) + len(prefixes)} orphans found.')
+
+    def referenced_media(self):
+        """
+        Returns the set of referenced file names and the set of referenced prefixes.
+        """
+        names, prefixes = set(), set()
+        for video in Video.objects.values('pk', *MEDIA_FILE_FIELDS).iterator():
+            names.update(video[field] for field in MEDIA_FILE_FIELDS if video[field])
+            prefixes.update(media_prefix(kind, video['pk']) for kind in MEDIA_KINDS)
+        for upload in VideoUpload.objects.filter(video__isnull=True).only('id').iterator():
+            prefixes.add(chunk_prefix(upload))
+        for name, is_prefix in MediaTombstone.objects.values_list('name', 'is_prefix').iterator():
+            (prefixes if is_prefix else names).add(name)
+        return names, prefixes
+
+    def find_orphans(self, prefix):
+        """
+        Yields (name, is_prefix) for every orphaned file or media directory below `prefix`.
+        """
+        try:
+            directories, files = default_storage.listdir(prefix)
+        except FileNotFoundError:
+            return
+        for directory in directories:
+            path = f'{prefix}/{directory}'
+            if path in self.prefixes:
+                continue
+            if prefix in [f'videos/{kind}' for kind in MEDIA_KINDS + ['uploads']]:
+                if self.is_old(path):
+                    yield path, True
+            else:
+                yield from self.find_orphans(path)
+
+        for file_name in files:
+            name = f'{prefix}/{file_name}'
+            if name not in self.names and default_storage.get_modified_time(name) < self.cutoff:
+                yield name, False
+
+    def is_old(self, prefix):
+        """
+        Checks whether every file below `prefix` is older than the `--min-age` cutoff.
+        """
+        directories, files = default_storage.listdir(prefix)
+        if any(default_storage.get_modified_time(f'{prefix}/{file_name}') >= self.cutoff for file_name in files):
+            return False
+        return all(self.is_old(f'{prefix}/{directory}') for directory in directories)
+
+    def still_orphaned(self, names, prefixes):
+        """
+        Drops the files which are referenced again and the media directories of videos and uploads
+        which exist (again), e.g. because they were created while the storage was listed.
+        """
+        referenced = referenced_names(names)
+        owners = {}
+        for prefix in prefixes:
+            kind, _, key = prefix.removeprefix('videos/').partition('/')
+            try:
+                owners[prefix] = (VideoUpload, uuid.UUID(key)) if kind == 'uploads' else (Video, int(key))
+            except ValueError:
+                continue
+        live = set()
+        for model in [Video, VideoUpload]:
+            ids = [pk for owner, pk in owners.values() if owner is model]
+            live.update((model, pk) for pk in model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        return (
+            [name for name in names if name not in referenced],
+            [prefix for prefix in prefixes if owners.get(prefix) not in live],
+        )
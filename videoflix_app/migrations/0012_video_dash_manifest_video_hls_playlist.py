@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0011_videoprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='dash_manifest',
+            field=models.FileField(blank=True, null=True, upload_to='videos/dash/'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='hls_playlist',
+            field=models.FileField(blank=True, null=True, upload_to='videos/hls/'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_progress(apps, schema_editor):
+    """
+    Keeps only the newest progress row per user and video before the unique constraint is added.
+    """
+    VideoProgress = apps.get_model('videoflix_app', 'VideoProgress')
+    latest_ids = {}
+    for progress_id, user_id, video_name in VideoProgress.objects.order_by('id').values_list('id', 'user_id', 'video_name'):
+        latest_ids[(user_id, video_name)] = progress_id
+    VideoProgress.objects.exclude(id__in=latest_ids.values()).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0012_video_dash_manifest_video_hls_playlist'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_progress, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='videoprogress',
+            constraint=models.UniqueConstraint(fields=('user', 'video_name'), name='unique_video_progress_per_user'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0013_videoprogress_unique_user_video'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoprogress',
+            name='video',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='videoflix_app.video'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:16
+
+import os
+from django.db import migrations
+
+
+def map_video_names(apps, schema_editor):
+    """
+    Links every progress row to the video its `video_name` refers to. The name is matched
+    against the video title first and against the names of the video files second.
+    Rows which match no video are deleted, as are older rows of a user for the same video.
+    """
+    Video = apps.get_model('videoflix_app', 'Video')
+    VideoProgress = apps.get_model('videoflix_app', 'VideoProgress')
+
+    videos_by_name = {}
+    for video in Video.objects.order_by('-id'):
+        for field in ['original_file', 'video_480p', 'video_720p', 'video_1080p']:
+            name = getattr(video, field).name
+            if name:
+                videos_by_name[os.path.splitext(os.path.basename(name))[0].lower()] = video.id
+    for video in Video.objects.order_by('-id'):
+        videos_by_name[video.title.lower()] = video.id
+
+    latest_ids = {}
+    for progress in VideoProgress.objects.order_by('id'):
+        video_id = videos_by_name.get(progress.video_name.lower())
+        if video_id is None:
+            video_id = videos_by_name.get(os.path.splitext(os.path.basename(progress.video_name))[0].lower())
+        if video_id is None:
+            continue
+        progress.video_id = video_id
+        progress.save(update_fields=['video'])
+        latest_ids[(progress.user_id, video_id)] = progress.id
+
+    VideoProgress.objects.exclude(id__in=latest_ids.values()).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0014_videoprogress_video'),
+    ]
+
+    operations = [
+        migrations.RunPython(map_video_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0015_videoprogress_map_video_names'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='videoprogress',
+            name='unique_video_progress_per_user',
+        ),
+        migrations.RemoveField(
+            model_name='videoprogress',
+            name='video_name',
+        ),
+        migrations.AlterField(
+            model_name='videoprogress',
+            name='video',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='videoflix_app.video'),
+        ),
+        migrations.AddConstraint(
+            model_name='videoprogress',
+            constraint=models.UniqueConstraint(fields=('user', 'video'), name='unique_video_progress_per_user_video'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0016_videoprogress_remove_video_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='duration',
+            field=models.FloatField(blank=True, help_text='Duration in seconds, read from the original file.', null=True),
+        ),
+        migrations.AddField(
+            model_name='videoprogress',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0018_videoupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='audio_channels',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='audio_layout',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='bitrate',
+            field=models.PositiveBigIntegerField(blank=True, help_text='Overall bitrate of the original file in bit/s.', null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='frame_rate',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='video_codec',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0019_video_media_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='preview_track',
+            field=models.FileField(blank=True, help_text='WebVTT track which maps time ranges to tiles of the sprite sheets.', null=True, upload_to='videos/previews/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0020_video_preview_track'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='poster_variants',
+            field=models.JSONField(blank=True, default=dict, help_text='Resized poster images per format and width, generated from the thumbnail.'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:20
+
+from django.db import migrations
+
+
+def link_categories(apps, schema_editor):
+    """
+    Creates one `Category` per distinct category name and points the videos to it,
+    with one UPDATE per category.
+    """
+    Category = apps.get_model('videoflix_app', 'Category')
+    Video = apps.get_model('videoflix_app', 'Video')
+    names = Video.objects.exclude(category__isnull=True).exclude(category='').values_list('category', flat=True).distinct()
+    for name in names:
+        category, _ = Category.objects.get_or_create(name=name.strip().lower())
+        Video.objects.filter(category=name).update(category_ref=category)
+
+
+def unlink_categories(apps, schema_editor):
+    Category = apps.get_model('videoflix_app', 'Category')
+    Video = apps.get_model('videoflix_app', 'Video')
+    for category in Category.objects.all():
+        Video.objects.filter(category_ref=category).update(category=category.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0023_category'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_categories, unlink_categories),
+    ]
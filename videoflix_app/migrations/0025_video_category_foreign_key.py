@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0024_video_category_data'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='video',
+            name='category',
+        ),
+        migrations.RenameField(
+            model_name='video',
+            old_name='category_ref',
+            new_name='category',
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='category',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='videos', to='videoflix_app.category'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='video_category_created'),
+        ),
+    ]
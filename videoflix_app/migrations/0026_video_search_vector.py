@@ -0,0 +1,68 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+CREATE_TRIGGER = '''
+CREATE FUNCTION videoflix_app_video_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER videoflix_app_video_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description ON videoflix_app_video
+    FOR EACH ROW EXECUTE FUNCTION videoflix_app_video_search_vector();
+
+UPDATE videoflix_app_video SET title = title;
+'''
+
+DROP_TRIGGER = '''
+DROP TRIGGER IF EXISTS videoflix_app_video_search_vector_update ON videoflix_app_video;
+DROP FUNCTION IF EXISTS videoflix_app_video_search_vector();
+'''
+
+
+def create_search_trigger(apps, schema_editor):
+    """
+    Keeps `search_vector` up to date in the database, so `bulk_create` and `update()` are
+    covered as well, and fills it for the existing videos. Only available on PostgreSQL.
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRIGGER)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0025_video_category_foreign_key'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='video',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Weighted tsvector of title and description, maintained by a database trigger.', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='video_search_vector'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='video_title_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
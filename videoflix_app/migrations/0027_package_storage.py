@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:24
+
+import videoflix_app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_app', '0026_video_search_vector'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='video',
+            name='dash_manifest',
+            field=models.FileField(blank=True, null=True, storage=videoflix_app.storage.package_storage, upload_to='videos/dash/'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='hls_playlist',
+            field=models.FileField(blank=True, null=True, storage=videoflix_app.storage.package_storage, upload_to='videos/hls/'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='preview_track',
+            field=models.FileField(blank=True, help_text='WebVTT track which maps time ranges to tiles of the sprite sheets.', null=True, storage=videoflix_app.storage.package_storage, upload_to='videos/previews/'),
+        ),
+    ]
@@ -1,21 +1,62 @@
+import uuid
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
+from .storage import package_storage
 
 User = get_user_model()
+class Category(models.Model):
+    """
+    A genre of the catalogue (e.g. sports, documentary). The category of a video is derived from
+    the filename of its thumbnail, the names are stored once here and referenced by the videos.
+    """
+    name = models.CharField(max_length=50, unique=True)
+
+    class Meta:
+        verbose_name_plural = 'categories'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
 class Video(models.Model):
     """
     Represents a video object in the system, including metadata, different resolution versions,
-    and thumbnails.
+    the adaptive streaming playlists (HLS and optional DASH), thumbnails and the WebVTT
+    track of the scrub previews.
     """
     original_file = models.FileField(upload_to='videos/originals/', blank=True, null=True)
     video_480p = models.FileField(upload_to='videos/480p/', blank=True, null=True)
     video_720p = models.FileField(upload_to='videos/720p/', blank=True, null=True)
     video_1080p = models.FileField(upload_to='videos/1080p/', blank=True, null=True)
+    hls_playlist = models.FileField(upload_to='videos/hls/', storage=package_storage, blank=True, null=True)
+    dash_manifest = models.FileField(upload_to='videos/dash/', storage=package_storage, blank=True, null=True)
+    preview_track = models.FileField(upload_to='videos/previews/', storage=package_storage, blank=True, null=True, help_text='WebVTT track which maps time ranges to tiles of the sprite sheets.')
+    poster_variants = models.JSONField(default=dict, blank=True, help_text='Resized poster images per format and width, generated from the thumbnail.')
     thumbnail = models.FileField(upload_to='img/', blank=True, null=True, help_text='Bitte Datei im Format beliebigerName_erlaubteKategorie.jpg oder .png! Erlaubte Kategorien: sports, documentary, romance, crime')
     title = models.CharField(max_length=250)
     description = models.TextField(max_length=1000)
     created_at = models.DateTimeField(auto_now_add=True)
-    category = models.CharField(max_length=50 , null=True, blank=True)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='videos', db_index=False)
+    duration = models.FloatField(null=True, blank=True, help_text='Duration in seconds, read from the original file.')
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    video_codec = models.CharField(max_length=50, blank=True, default='')
+    bitrate = models.PositiveBigIntegerField(null=True, blank=True, help_text='Overall bitrate of the original file in bit/s.')
+    frame_rate = models.FloatField(null=True, blank=True)
+    audio_channels = models.PositiveSmallIntegerField(null=True, blank=True)
+    audio_layout = models.CharField(max_length=50, blank=True, default='')
+    search_vector = SearchVectorField(null=True, editable=False, help_text='Weighted tsvector of title and description, maintained by a database trigger.')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', '-created_at', '-id'], name='video_category_created'),
+            GinIndex(fields=['search_vector'], name='video_search_vector'),
+            GinIndex(fields=['title'], name='video_title_trgm', opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return self.title
@@ -24,10 +65,72 @@ class Video(models.Model):
 class VideoProgress(models.Model):
     """
     Tracks a user's progress in watching a particular video, including the current playback position.
+    There is at most one row per user and video, new positions update it.
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    video_name = models.CharField(max_length=150)
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='progress')
     current_time = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'video'], name='unique_video_progress_per_user_video'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.video} - {self.current_time}'
+
+
+class VideoUpload(models.Model):
+    """
+    A resumable upload of an original video file. The file is sent in chunks, which are stored
+    as `videos/uploads/<id>/<offset>.chunk` in the media storage. Once the last chunk is stored,
+    an RQ job joins them and creates the `Video`.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=250)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    title = models.CharField(max_length=250)
+    description = models.TextField(max_length=1000)
+    thumbnail = models.FileField(upload_to='img/', blank=True, null=True)
+    video = models.OneToOneField(Video, on_delete=models.SET_NULL, blank=True, null=True, related_name='upload')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def state(self):
+        """
+        `uploading` while chunks are missing, `assembling` while the job joins the chunks
+        and `completed` once the video has been created.
+        """
+        if self.video_id:
+            return 'completed'
+        if self.offset >= self.size:
+            return 'assembling'
+        return 'uploading'
+
+    def __str__(self):
+        return f'{self.user} - {self.filename} - {self.offset}/{self.size}'
+
+
+class MediaTombstone(models.Model):
+    """
+    A stored file (or with `is_prefix` everything below a storage prefix) which is no longer
+    referenced and waits for the garbage collection job. Tombstones are written in the
+    transaction which removes the reference, so a rollback keeps the files.
+    """
+    name = models.CharField(max_length=500)
+    is_prefix = models.BooleanField(default=False)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='tombstone_next_attempt'),
+        ]
 
     def __str__(self):
-        return f'{self.user} - {self.video_name} - {self.current_time}'
\ No newline at end of file
+        return f'{self.name}{"/" if self.is_prefix else ""} - {self.attempts}'
@@ -0,0 +1,109 @@
+import math
+import os
+from django.conf import settings
+
+
+PREVIEW_INTERVAL = getattr(settings, 'VIDEO_PREVIEW_INTERVAL', 10)
+PREVIEW_WIDTH = getattr(settings, 'VIDEO_PREVIEW_WIDTH', 160)
+PREVIEW_COLUMNS = getattr(settings, 'VIDEO_PREVIEW_COLUMNS', 10)
+PREVIEW_ROWS = getattr(settings, 'VIDEO_PREVIEW_ROWS', 10)
+PREVIEW_QUALITY = 5
+SPRITE_PATTERN = 'sprite_%03d.jpg'
+
+POSTER_WIDTHS = getattr(settings, 'VIDEO_POSTER_WIDTHS', [320, 640, 1280])
+POSTER_FORMATS = getattr(settings, 'VIDEO_POSTER_FORMATS', ['avif', 'webp', 'jpeg'])
+POSTER_FRAME_POSITION = 0.1
+POSTER_ENCODERS = {
+    'avif': ['-c:v', 'libaom-av1', '-still-picture', '1', '-crf', '35', '-cpu-used', '6'],
+    'webp': ['-c:v', 'libwebp', '-quality', '75'],
+    'jpeg': ['-c:v', 'mjpeg', '-q:v', '4'],
+}
+POSTER_EXTENSIONS = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def tile_size(width, height):
+    """
+    Returns (width, height) of one preview tile. The tile keeps the aspect ratio of the video,
+    16:9 is assumed if the size of the video is unknown.
+    """
+    if not width or not height:
+        width, height = 16, 9
+    tile_height = max(2, round(PREVIEW_WIDTH * height / width / 2) * 2)
+    return PREVIEW_WIDTH, tile_height
+
+
+def build_sprite_command(source, output_dir, tile):
+    """
+    Builds the ffmpeg command which takes one frame every `VIDEO_PREVIEW_INTERVAL` seconds and
+    tiles the frames into JPEG sprite sheets of `VIDEO_PREVIEW_COLUMNS` x `VIDEO_PREVIEW_ROWS`
+    in a single pass.
+    """
+    tile_width, tile_height = tile
+    filters = f'fps=1/{PREVIEW_INTERVAL},scale={tile_width}:{tile_height},tile={PREVIEW_COLUMNS}x{PREVIEW_ROWS}'
+    return [
+        'ffmpeg', '-y', '-i', source, '-an', '-vf', filters,
+        '-q:v', str(PREVIEW_QUALITY), '-start_number', '0', os.path.join(output_dir, SPRITE_PATTERN),
+    ]
+
+
+def format_timestamp(seconds):
+    """
+    Formats seconds as a WebVTT timestamp (`hh:mm:ss.ttt`).
+    """
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f'{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}'
+
+
+def build_thumbnail_vtt(duration, tile):
+    """
+    Builds the WebVTT thumbnail track: one cue per preview frame which points to its tile inside
+    the sprite sheet (`sprite_000.jpg#xywh=x,y,w,h`). The sprite paths are relative to the track.
+    """
+    tile_width, tile_height = tile
+    per_sheet = PREVIEW_COLUMNS * PREVIEW_ROWS
+    lines = ['WEBVTT', '']
+    for index in range(math.ceil(duration / PREVIEW_INTERVAL)):
+        start = index * PREVIEW_INTERVAL
+        end = min(start + PREVIEW_INTERVAL, duration)
+        position = index % per_sheet
+        x = position % PREVIEW_COLUMNS * tile_width
+        y = position // PREVIEW_COLUMNS * tile_height
+        sprite = SPRITE_PATTERN % (index // per_sheet)
+        lines += [
+            f'{format_timestamp(start)} --> {format_timestamp(end)}',
+            f'{sprite}#xywh={x},{y},{tile_width},{tile_height}',
+            '',
+        ]
+    return '\n'.join(lines)
+
+
+def poster_path(output_dir, image_format, width):
+    """
+    Returns the path of one poster variant.
+    """
+    return os.path.join(output_dir, f'poster_{width}.{POSTER_EXTENSIONS[image_format]}')
+
+
+def build_poster_command(source, output_dir, image_format, widths=None):
+    """
+    Builds the ffmpeg command which writes the poster in one format at the given widths
+    (`VIDEO_POSTER_WIDTHS` by default). The image is decoded once, every width is a separate output.
+    """
+    cmd = ['ffmpeg', '-y', '-i', source]
+    for width in widths or POSTER_WIDTHS:
+        cmd += [
+            '-vf', f'scale={width}:-2', '-frames:v', '1', *POSTER_ENCODERS[image_format],
+            poster_path(output_dir, image_format, width),
+        ]
+    return cmd
+
+
+def build_poster_frame_command(source, duration, target):
+    """
+    Builds the ffmpeg command which extracts a poster frame at 10 % of the video as JPEG.
+    """
+    position = (duration or 0) * POSTER_FRAME_POSITION
+    return ['ffmpeg', '-y', '-ss', str(position), '-i', source, '-frames:v', '1', '-q:v', '2', target]
@@ -0,0 +1,141 @@
+import subprocess
+import time
+from django.core.cache import cache
+
+
+PROCESSING_STATUS_TTL = 60 * 60 * 24
+
+
+def processing_status_key(video_id):
+    """
+    Returns the cache key of the processing status of a video.
+    """
+    return f'video-processing:{video_id}'
+
+
+def rendition_progress_key(video_id, rendition):
+    """
+    Returns the cache key of the progress of one rendition of a video.
+    """
+    return f'video-processing:{video_id}:{rendition}'
+
+
+def get_processing_status(video_id):
+    """
+    Returns the published processing status of a video or None.
+
+    The progress of every rendition is published under its own key (see `publish_progress`)
+    and merged in here. While transcoding, the overall percentage is the mean of all renditions
+    which reported progress so far, fps, speed and ETA are those of the latest report.
+    """
+    status = cache.get(processing_status_key(video_id))
+    if status is None:
+        return None
+
+    keys = {rendition: rendition_progress_key(video_id, rendition) for rendition in status['renditions']}
+    progress = cache.get_many(keys.values())
+    latest = None
+    for rendition, key in keys.items():
+        if key in progress:
+            status['renditions'][rendition] = progress[key]['percent']
+            if latest is None or progress[key]['updated_at'] >= latest['updated_at']:
+                latest = {field: progress[key][field] for field in ['fps', 'speed', 'eta', 'updated_at']}
+                latest['rendition'] = rendition
+
+    if status['state'] == 'transcoding':
+        known = [value for value in status['renditions'].values() if value is not None]
+        status['percent'] = round(sum(known) / len(known), 1) if known else None
+        if latest is not None:
+            status.update(latest)
+    return status
+
+
+def set_processing_state(video_id, state, **extra):
+    """
+    Publishes a new processing state (`queued`, `transcoding`, `packaging`, `done` or `failed`).
+    The progress of the renditions is kept, so the last known numbers stay visible. A new set of
+    `renditions` starts their progress from scratch.
+    """
+    status = get_processing_status(video_id) or {'renditions': {}}
+    if 'renditions' in extra:
+        cache.delete_many([rendition_progress_key(video_id, rendition) for rendition in extra['renditions']])
+    status.update(extra, state=state, updated_at=time.time())
+    if state == 'done':
+        status['percent'] = 100.0
+        status['eta'] = 0
+    cache.set(processing_status_key(video_id), status, PROCESSING_STATUS_TTL)
+
+
+def publish_progress(video_id, rendition, percent, fps, speed, eta):
+    """
+    Publishes the progress of one running ffmpeg process under the key of its rendition.
+    Renditions encoded at the same time (threads of the `pool` mode, parallel RQ jobs) each
+    write their own key, so none of them overwrites the numbers of another one.
+    """
+    cache.add(
+        processing_status_key(video_id),
+        {'renditions': {rendition: None}, 'state': 'transcoding', 'updated_at': time.time()},
+        PROCESSING_STATUS_TTL,
+    )
+    cache.set(
+        rendition_progress_key(video_id, rendition),
+        {'percent': percent, 'fps': fps, 'speed': speed, 'eta': eta, 'updated_at': time.time()},
+        PROCESSING_STATUS_TTL,
+    )
+
+
+def parse_progress_block(values, duration):
+    """
+    Turns one block of ffmpeg `-progress` output into (percent, fps, speed, eta).
+
+    Args:
+        values (dict): The key/value pairs of the block, e.g. `out_time_us`, `fps`, `speed`.
+        duration (float): Duration of the source in seconds, or None if unknown.
+    """
+    try:
+        out_time = int(values.get('out_time_us', '')) / 1000000
+    except ValueError:
+        out_time = 0.0
+    try:
+        fps = float(values.get('fps', ''))
+    except ValueError:
+        fps = None
+    try:
+        speed = float(values.get('speed', '').rstrip('x'))
+    except ValueError:
+        speed = None
+
+    if values.get('progress') == 'end':
+        return 100.0, fps, speed, 0
+    if not duration:
+        return None, fps, speed, None
+
+    percent = round(min(out_time / duration * 100, 100.0), 1)
+    eta = round((duration - out_time) / speed) if speed else None
+    return percent, fps, speed, eta
+
+
+def run_ffmpeg(cmd, video_id=None, rendition='', duration=None):
+    """
+    Runs an ffmpeg command and publishes its progress for the given video.
+
+    ffmpeg writes machine readable progress (`-progress pipe:1`) to stdout in blocks which
+    end with a `progress=continue` or `progress=end` line. Every block is published with
+    `publish_progress`. Raises `subprocess.CalledProcessError` if ffmpeg fails.
+    """
+    if video_id is None:
+        return subprocess.run(cmd, check=True)
+
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    values = {}
+    for line in process.stdout:
+        key, _, value = line.strip().partition('=')
+        values[key] = value
+        if key == 'progress':
+            publish_progress(video_id, rendition, *parse_progress_block(values, duration))
+            values = {}
+
+    if process.wait() != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+    return process
@@ -0,0 +1,140 @@
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from .models import Video, VideoProgress
+from .cache import CACHE_TTL, catalogue_version
+from .queues import MAINTENANCE, get_queue
+
+
+PROGRESS_BUFFERED = getattr(settings, 'VIDEO_PROGRESS_BUFFERED', False)
+PROGRESS_FLUSH_INTERVAL = getattr(settings, 'VIDEO_PROGRESS_FLUSH_INTERVAL', 30)
+PROGRESS_BUFFER_KEY = 'video-progress:buffer'
+PROGRESS_FLUSH_SCHEDULED_KEY = 'video-progress:flush-scheduled'
+PROGRESS_BATCH_SIZE = 500
+CONTINUE_WATCHING_TTL = CACHE_TTL
+
+
+def save_progress(entries):
+    """
+    Writes watch positions with one `INSERT ... ON CONFLICT (user, video) DO UPDATE`
+    per batch, so repeated reports update the existing row instead of adding new ones.
+
+    Args:
+        entries (list): Tuples of (user_id, video_id, current_time).
+
+    Returns:
+        list: The saved `VideoProgress` instances.
+    """
+    progress = VideoProgress.objects.bulk_create(
+        [VideoProgress(user_id=user_id, video_id=video_id, current_time=current_time)
+         for user_id, video_id, current_time in entries],
+        update_conflicts=True,
+        unique_fields=['user', 'video'],
+        update_fields=['current_time', 'updated_at'],
+        batch_size=PROGRESS_BATCH_SIZE,
+    )
+    invalidate_continue_watching({user_id for user_id, _, _ in entries})
+    return progress
+
+
+def existing_entries(entries):
+    """
+    Returns the entries whose user and video still exist. Buffered heartbeats can outlive a
+    deleted video or user, and a single one of them would make the whole batch fail.
+    """
+    user_ids = set(get_user_model().objects.filter(id__in={user_id for user_id, _, _ in entries}).values_list('id', flat=True))
+    video_ids = set(Video.objects.filter(id__in={video_id for _, video_id, _ in entries}).values_list('id', flat=True))
+    return [entry for entry in entries if entry[0] in user_ids and entry[1] in video_ids]
+
+
+def continue_watching_cache_key(user_id):
+    """
+    Returns the cache key of a user's "continue watching" list. The key contains the catalogue
+    version, so changes to the videos themselves invalidate the list as well.
+    """
+    return f'video-progress:continue-watching:{catalogue_version()}:{user_id}'
+
+
+def invalidate_continue_watching(user_ids):
+    """
+    Removes the cached "continue watching" lists of the given users.
+    """
+    cache.delete_many([continue_watching_cache_key(user_id) for user_id in user_ids])
+
+
+def redis_connection():
+    """
+    Returns the raw Redis connection of the default cache.
+    """
+    return get_redis_connection('default')
+
+
+def buffer_key(user_id, video_id):
+    """
+    Returns the field name of a (user, video) pair inside the heartbeat buffer hash.
+    """
+    return json.dumps([user_id, video_id])
+
+
+def buffer_progress(user_id, video_id, current_time):
+    """
+    Stores a heartbeat in a Redis hash instead of the database. Later heartbeats of the same
+    user and video overwrite earlier ones, so only the newest position gets flushed.
+    """
+    redis = redis_connection()
+    redis.hset(cache.make_key(PROGRESS_BUFFER_KEY), buffer_key(user_id, video_id), current_time)
+    schedule_progress_flush()
+
+
+def buffered_progress(user_id, video_id):
+    """
+    Returns the buffered, not yet flushed position of a user and video or None. The hash of a
+    running flush is read as well, its entries are not in the database yet.
+    """
+    if not PROGRESS_BUFFERED:
+        return None
+    key = cache.make_key(PROGRESS_BUFFER_KEY)
+    field = buffer_key(user_id, video_id)
+    redis = redis_connection()
+    value = redis.hget(key, field)
+    if value is None:
+        value = redis.hget(key + ':flushing', field)
+    return float(value) if value is not None else None
+
+
+def schedule_progress_flush():
+    """
+    Schedules one flush job per flush interval on the `maintenance` queue.
+    Requires an RQ worker started with `--with-scheduler`.
+    """
+    if cache.add(PROGRESS_FLUSH_SCHEDULED_KEY, True, timeout=PROGRESS_FLUSH_INTERVAL):
+        from .tasks import flush_progress_buffer
+        queue = get_queue(MAINTENANCE)
+        queue.enqueue_in(timedelta(seconds=PROGRESS_FLUSH_INTERVAL), flush_progress_buffer)
+
+
+def take_buffered_progress():
+    """
+    Atomically moves the heartbeat buffer aside and returns its entries. Entries of a flush which
+    crashed before it finished are picked up again first.
+
+    Returns:
+        tuple: The name of the moved hash (to delete after saving) and the list of entries.
+    """
+    redis = redis_connection()
+    key = cache.make_key(PROGRESS_BUFFER_KEY)
+    flushing_key = key + ':flushing'
+
+    if not redis.exists(flushing_key):
+        if not redis.exists(key):
+            return flushing_key, []
+        redis.rename(key, flushing_key)
+
+    entries = []
+    for field, value in redis.hgetall(flushing_key).items():
+        user_id, video_id = json.loads(field)
+        entries.append((user_id, video_id, float(value)))
+    return flushing_key, entries
@@ -0,0 +1,56 @@
+from django.conf import settings
+from rq import get_current_job
+import django_rq
+
+
+TRANSCODE_HIGH = 'transcode-high'
+TRANSCODE_DEFAULT = 'default'
+TRANSCODE_BULK = 'transcode-bulk'
+EMAIL = 'email'
+MAINTENANCE = 'maintenance'
+
+TRANSCODE_PRIORITIES = {'high': TRANSCODE_HIGH, 'default': TRANSCODE_DEFAULT, 'bulk': TRANSCODE_BULK}
+SHORT_UPLOAD_SECONDS = getattr(settings, 'VIDEO_SHORT_UPLOAD_SECONDS', 300)
+TRANSCODE_TIMEOUT_FACTOR = getattr(settings, 'VIDEO_TRANSCODE_TIMEOUT_FACTOR', 4)
+TRANSCODE_MIN_TIMEOUT = getattr(settings, 'VIDEO_TRANSCODE_MIN_TIMEOUT', 600)
+
+
+def get_queue(name):
+    """
+    Returns the RQ queue with the given name.
+    """
+    return django_rq.get_queue(name, autocommit=True)
+
+
+def transcode_queue_name(duration, priority=None):
+    """
+    Returns the queue of a conversion.
+
+    - An explicit priority wins (`high` for admin re-encodes, `bulk` for imports of `create_video_list`).
+    - Otherwise uploads up to `VIDEO_SHORT_UPLOAD_SECONDS` go to `transcode-high`, so a short clip
+      is not stuck behind a feature film, and longer uploads go to `default`.
+    """
+    if priority:
+        return TRANSCODE_PRIORITIES[priority]
+    if duration is not None and duration <= SHORT_UPLOAD_SECONDS:
+        return TRANSCODE_HIGH
+    return TRANSCODE_DEFAULT
+
+
+def current_queue(default=TRANSCODE_DEFAULT):
+    """
+    Returns the queue of the running job, so follow-up jobs of a conversion stay on the
+    priority it was routed to. Outside of a worker the `default` queue is returned.
+    """
+    job = get_current_job()
+    return get_queue(job.origin if job else default)
+
+
+def transcode_timeout(duration, renditions=1):
+    """
+    Returns the job timeout in seconds for encoding `duration` seconds of media into the given
+    number of renditions. Without a known duration the timeout of the queue is used (None).
+    """
+    if not duration:
+        return None
+    return max(TRANSCODE_MIN_TIMEOUT, int(duration * renditions * TRANSCODE_TIMEOUT_FACTOR))
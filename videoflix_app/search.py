@@ -0,0 +1,43 @@
+import re
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db.models import F, Q
+
+
+SEARCH_CONFIG = 'english'
+SEARCH_LIMIT = getattr(settings, 'VIDEO_SEARCH_LIMIT', 20)
+SEARCH_MAX_LIMIT = 100
+
+
+def search_query(text):
+    """
+    Turns the user input into a full-text query with prefix matching, so `"giant oce"` finds
+    "Giants of the Ocean" while the user is still typing. Every word must match (`giant:* & oce:*`).
+    Only word characters are kept, so the input can not inject tsquery operators.
+    Returns None if the input contains no words.
+    """
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    return SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_videos(queryset, text):
+    """
+    Searches the videos for the given text and orders them by relevance.
+
+    - Full-text matches on the `search_vector` column (title weighted above description)
+      use the GIN index on the column and are ranked with `ts_rank`.
+    - Titles with a trigram similarity above `pg_trgm.similarity_threshold` (default 0.3)
+      also match, so typos like "giamts" still find "Giants". The `%` operator uses the
+      trigram GIN index on the title.
+    """
+    query = search_query(text)
+    if query is None:
+        return queryset.none()
+    return (
+        queryset
+        .annotate(rank=SearchRank(F('search_vector'), query), similarity=TrigramSimilarity('title', text))
+        .filter(Q(search_vector=query) | Q(title__trigram_similar=text))
+        .order_by('-rank', '-similarity', '-id')
+    )
@@ -1,21 +1,31 @@
 from .models import Video
-from .tasks import convert_video
+from .tasks import convert_video, generate_posters, prepare_conversion
+from .cache import invalidate_catalogue
+from .processing import set_processing_state
+from .queues import TRANSCODE_BULK, TRANSCODE_HIGH, TRANSCODE_PRIORITIES, get_queue, transcode_timeout
+from .encoding import select_renditions
+from rq.job import Dependency
+from .garbage import bury, video_media
+from django.db import transaction
 from django.dispatch import receiver
 from django.db.models.signals import post_save, post_delete
-import os
-import django_rq
 
 
 @receiver(post_save, sender=Video)
-def video_post_save(sender, instance, created, **kwargs):
+def video_post_save(sender, instance, created, update_fields=None, **kwargs):
     """
     Signal handler for the `post_save` signal of the `Video` model. This function 
     is triggered whenever a new `Video` instance is saved.
 
     - If the video instance is newly created, it prints a success message and enqueues 
       a task to convert the original video to different resolutions (480p, 720p, 1080p) using a task queue.
+      The job only gets the primary key and is enqueued once the creating transaction has been
+      committed, so the worker always finds the committed row. A `transcode_priority` attribute
+      set on the instance before saving (e.g. `bulk` for imports) routes the conversion.
     - If the video instance is updated (not created), it prints a message that the details 
-      of the video were saved, but does not trigger any additional actions.
+      of the video were saved.
+    - Whenever the thumbnail is new or was replaced, the poster variants are generated after the commit.
+    - In both cases the cached catalogue responses are invalidated.
 
     Args:
         sender (Model): The model class that sent the signal.
@@ -25,11 +35,65 @@ def video_post_save(sender, instance, created, **kwargs):
     """
     if created:
         print('New video created')
-        queue = django_rq.get_queue('default', autocommit=True)
-        queue.enqueue(convert_video, instance.original_file.path, instance)
+        if instance.original_file:
+            priority = getattr(instance, 'transcode_priority', None)
+            transaction.on_commit(lambda: enqueue_conversion(instance.pk, priority))
     else:
         print('Edited video details saved')
 
+    thumbnail_saved = update_fields is None or 'thumbnail' in update_fields
+    if thumbnail_saved and instance.thumbnail and instance.poster_variants.get('source') != instance.thumbnail.name:
+        transaction.on_commit(lambda: enqueue_posters(instance.pk))
+    invalidate_catalogue()
+
+
+def enqueue_conversion(video_id, priority=None):
+    """
+    Enqueues the conversion of a video and marks it as queued. The short inspection job runs on
+    the queue of the given priority (`transcode-high` without one) and routes the encode itself.
+    """
+    queue = get_queue(TRANSCODE_PRIORITIES.get(priority, TRANSCODE_HIGH))
+    queue.enqueue(prepare_conversion, video_id, priority)
+    set_processing_state(video_id, 'queued')
+
+
+def enqueue_posters(video_id):
+    """
+    Enqueues the generation of the poster variants. The job is short, so it runs on the high priority queue.
+    """
+    get_queue(TRANSCODE_HIGH).enqueue(generate_posters, video_id)
+
+
+def enqueue_bulk_conversions(videos, concurrency):
+    """
+    Enqueues the conversions of imported videos, which were created with `bulk_create` and so
+    did not send `post_save`. The videos already carry their media metadata, so `convert_video`
+    is enqueued directly on the `transcode-bulk` queue with a timeout scaled to the duration.
+
+    The jobs form `concurrency` chains in which every job waits for its predecessor (also if it
+    failed), so at most `concurrency` conversions of an import run at the same time. The poster
+    variants of the thumbnails are enqueued as one batch.
+
+    Args:
+        videos (list): The created `Video` instances.
+        concurrency (int): Maximum number of conversions running at the same time.
+    """
+    queue = get_queue(TRANSCODE_BULK)
+    chains = [None] * max(concurrency, 1)
+    for index, video in enumerate(videos):
+        chain = index % len(chains)
+        renditions = len(select_renditions(video.width, video.height))
+        chains[chain] = queue.enqueue(
+            convert_video, video.pk,
+            job_timeout=transcode_timeout(video.duration, renditions),
+            depends_on=Dependency(jobs=[chains[chain]], allow_failure=True) if chains[chain] else None,
+        )
+        set_processing_state(video.pk, 'queued')
+
+    queue.enqueue_many([
+        queue.prepare_data(generate_posters, (video.pk,)) for video in videos if video.thumbnail
+    ])
+
 
 @receiver(post_delete, sender=Video)
 def video_post_delete(sender, instance, *args, **kwargs):
@@ -37,11 +101,16 @@ def video_post_delete(sender, instance, *args, **kwargs):
     Signal handler for the `post_delete` signal of the `Video` model. This function 
     is triggered whenever a `Video` instance is deleted.
 
-    - It deletes the associated video files from the file system, including:
+    - It writes tombstones for the associated files in the media storage, including:
         - The original video file
         - The converted video files in various resolutions (480p, 720p, 1080p)
         - The thumbnail image
-    - It prints messages to indicate which files were deleted and that the video object itself was deleted.
+        - The HLS and DASH packaging folders, the scrub previews, the poster variants and the pieces of an unfinished segmented conversion
+    - The tombstones are part of the deleting transaction, the files themselves are deleted in batches
+      by the `collect_media_garbage` job after the commit. A rolled back delete keeps its files and
+      deleting many videos in the admin does not wait for the storage.
+    - It prints a message to indicate that the video object itself was deleted.
+    - It invalidates the cached catalogue responses.
 
     Args:
         sender (Model): The model class that sent the signal.
@@ -49,28 +118,6 @@ def video_post_delete(sender, instance, *args, **kwargs):
         args (tuple): Additional positional arguments.
         kwargs (dict): Additional keyword arguments.
     """
-    if instance.original_file and instance.original_file.name:
-        original_path = instance.original_file.path
-        if os.path.isfile(original_path):
-            os.remove(original_path)
-            print('Originaldatei gelöscht!')
-
-    resolutions = ['480p', '720p', '1080p']
-    for resolution in resolutions:
-        
-        field_name = f'video_{resolution}'
-        video_field = getattr(instance, field_name, None)
-        
-        if video_field and video_field.name:
-            converted_path = video_field.path
-            if os.path.isfile(converted_path):
-                os.remove(converted_path)
-                print(f'{resolution} Datei gelöscht!')
-
-    if instance.thumbnail and instance.thumbnail.name:
-        thumbnail_path = instance.thumbnail.path
-        if os.path.isfile(thumbnail_path):
-            os.remove(thumbnail_path)
-            print('Thumbnail-Datei gelöscht!')
-
-    print('Video-Objekt gelöscht!')
\ No newline at end of file
+    bury(*video_media(instance))
+    invalidate_catalogue()
+    print('Video-Objekt gelöscht!')
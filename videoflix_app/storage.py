@@ -0,0 +1,220 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage, default_storage, storages
+from django.utils.functional import LazyObject
+
+
+WORK_DIR = getattr(settings, 'VIDEO_WORK_DIR', None) or None
+UPLOAD_CONCURRENCY = getattr(settings, 'MEDIA_UPLOAD_CONCURRENCY', 8)
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class LocalObjectStorage(Storage):
+    """
+    Local stand-in for an object store (S3, MinIO). The files are kept below MEDIA_ROOT, but the
+    storage offers no `path()`, so every caller has to use open/save/delete/listdir like with S3.
+    Used by the tests and for local development without MinIO.
+    """
+
+    def __init__(self, location=None, base_url=None):
+        self._files = FileSystemStorage(location, base_url)
+
+    def _open(self, name, mode='rb'):
+        return self._files._open(name, mode)
+
+    def _save(self, name, content):
+        return self._files._save(name, content)
+
+    def delete(self, name):
+        self._files.delete(name)
+
+    def exists(self, name):
+        return self._files.exists(name)
+
+    def listdir(self, path):
+        try:
+            return self._files.listdir(path)
+        except FileNotFoundError:
+            return [], []
+
+    def size(self, name):
+        return self._files.size(name)
+
+    def url(self, name):
+        return self._files.url(name)
+
+    def get_modified_time(self, name):
+        return self._files.get_modified_time(name)
+
+
+class PackageStorage(LazyObject):
+    """
+    Storage of the HLS/DASH packages and the preview tracks (`STORAGES['packages']`, otherwise the
+    default storage). Players resolve segments and sprite sheets relative to the playlist URL,
+    so these files are linked without signature, see `STORAGES` in the settings.
+    """
+
+    def _setup(self):
+        self._wrapped = storages['packages' if 'packages' in settings.STORAGES else 'default']
+
+
+package_storage_instance = PackageStorage()
+
+
+def package_storage():
+    """
+    Returns the storage of the packaged media, used as callable `storage` of the model fields.
+    """
+    return package_storage_instance
+
+
+def local_path(name):
+    """
+    Returns the local path of a stored file or None if the storage has no local files.
+    """
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def media_prefix(kind, video_id):
+    """
+    Returns the storage prefix which holds the generated files of one kind (`hls`, `dash`,
+    `previews`, `posters`, `segments`) of a video, e.g. `videos/hls/5`.
+    """
+    return f'videos/{kind}/{video_id}'
+
+
+def work_dir(video_id):
+    """
+    Returns a temporary working directory for one job (below `VIDEO_WORK_DIR` if set).
+    Use it as context manager, the directory is removed afterwards.
+    """
+    return tempfile.TemporaryDirectory(prefix=f'videoflix-{video_id}-', dir=WORK_DIR)
+
+
+def fetch(name, target_dir):
+    """
+    Makes a stored file available in the working directory and returns its local path.
+
+    With local storage the file is only linked. Otherwise it is streamed in chunks from the
+    object store, so any worker can process any video.
+    """
+    target = os.path.join(target_dir, os.path.basename(name))
+    path = local_path(name)
+    if path is not None:
+        os.symlink(path, target)
+        return target
+
+    with default_storage.open(name, 'rb') as source, open(target, 'wb') as f:
+        for chunk in source.chunks(COPY_CHUNK_SIZE):
+            f.write(chunk)
+    return target
+
+
+def probe_location(name, target_dir):
+    """
+    Returns a path or URL from which ffprobe can read a stored file without copying all of it:
+    the local path, or the (signed) URL of an object store, where ffprobe only requests the ranges
+    it needs. Storages with neither a local path nor an absolute URL fall back to `fetch`.
+    """
+    path = local_path(name)
+    if path is not None:
+        return path
+    url = default_storage.url(name)
+    if url.startswith(('http://', 'https://')):
+        return url
+    return fetch(name, target_dir)
+
+
+def store(path, name):
+    """
+    Stores a local file under exactly `name` and replaces an existing file. The S3 backend
+    uploads large files in parallel multipart chunks (see `transfer_config` in `STORAGES`).
+    """
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    with open(path, 'rb') as f:
+        return default_storage.save(name, File(f))
+
+
+def store_directory(local_dir, prefix):
+    """
+    Replaces everything below `prefix` with the files of a local directory (HLS/DASH packages,
+    previews, posters). The files are uploaded in parallel, up to `MEDIA_UPLOAD_CONCURRENCY` at a time.
+    """
+    delete_prefix(prefix)
+    files = []
+    for root, _, names in os.walk(local_dir):
+        for file_name in names:
+            path = os.path.join(root, file_name)
+            files.append((path, f'{prefix}/{os.path.relpath(path, local_dir).replace(os.sep, "/")}'))
+
+    with ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY) as executor:
+        return list(executor.map(lambda file: store(*file), files))
+
+
+def delete_prefix(prefix):
+    """
+    Deletes all stored files below `prefix`.
+    """
+    path = local_path(prefix)
+    if path is not None:
+        shutil.rmtree(path, ignore_errors=True)
+        return
+
+    directories, files = default_storage.listdir(prefix)
+    for directory in directories:
+        delete_prefix(f'{prefix}/{directory}')
+    for file_name in files:
+        default_storage.delete(f'{prefix}/{file_name}')
+
+
+def import_file(path, name):
+    """
+    Stores a local file (e.g. of an import folder) under a free name based on `name` and returns it.
+
+    With local storage on the same filesystem the file is hardlinked, so nothing is copied. Across
+    filesystems the kernel copies it with `copy_file_range`, which reflinks on copy-on-write
+    filesystems (btrfs, XFS). Object stores get a regular upload.
+    """
+    name = default_storage.get_available_name(name)
+    target = local_path(name)
+    if target is not None:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(path, target)
+            return name
+        except OSError:
+            pass
+        try:
+            copy_local(path, target)
+            return name
+        except OSError:
+            pass
+
+    with open(path, 'rb') as f:
+        return default_storage.save(name, File(f))
+
+
+def copy_local(path, target):
+    """
+    Copies a file inside the kernel without passing the data through Python.
+    A partly written target is removed if the copy fails.
+    """
+    with open(path, 'rb') as source, open(target, 'xb') as f:
+        try:
+            remaining = os.fstat(source.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(source.fileno(), f.fileno(), remaining)
+                if not copied:
+                    raise OSError(f'copy_file_range stopped with {remaining} bytes left')
+                remaining -= copied
+        except OSError:
+            os.remove(target)
+            raise
@@ -0,0 +1,174 @@
+import mimetypes
+import re
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_OFFLOAD = getattr(settings, 'VIDEO_STREAM_OFFLOAD', '')
+STREAM_ACCEL_PREFIX = getattr(settings, 'VIDEO_STREAM_ACCEL_PREFIX', '/protected-media/')
+
+
+class RangeNotSatisfiable(Exception):
+    """
+    Raised when a `Range` header does not overlap the file at all.
+    """
+
+
+def parse_range(header, size):
+    """
+    Parses a single byte range of a `Range` header into an inclusive (start, end) tuple.
+
+    Returns None if the header is missing, malformed or asks for several ranges; the whole
+    file is sent in that case, which RFC 9110 allows. Raises `RangeNotSatisfiable` if the
+    range lies outside the file.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if start == '':
+        if end == '':
+            return None
+        suffix_length = int(end)
+        if suffix_length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(size - suffix_length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def range_applies(request, etag, last_modified):
+    """
+    Evaluates `If-Range`: the range is only honoured if the client still holds the current
+    version of the file, otherwise the whole file is sent.
+    """
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and int(last_modified) <= date
+
+
+def not_modified(request, etag, last_modified):
+    """
+    Evaluates `If-None-Match` and `If-Modified-Since` of a conditional GET.
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and int(last_modified) <= if_modified_since
+
+
+def s3_object(name):
+    """
+    Returns the boto3 object of a stored file if the media storage is S3 (django-storages), else None.
+    """
+    bucket = getattr(default_storage, 'bucket', None)
+    if bucket is None:
+        return None
+    return bucket.Object(default_storage._normalize_name(name))
+
+
+def read_range(name, start, length):
+    """
+    Yields `length` bytes of a stored file starting at `start` in chunks of STREAM_CHUNK_SIZE.
+
+    On S3 only the range is requested with a ranged `GetObject`. Opening the file through the storage
+    would download the whole object to the web worker first (`S3File` spools it on the first read).
+    """
+    obj = s3_object(name)
+    if obj is not None:
+        if length > 0:
+            body = obj.get(Range=f'bytes={start}-{start + length - 1}')['Body']
+            yield from body.iter_chunks(STREAM_CHUNK_SIZE)
+        return
+
+    with default_storage.open(name, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def offload_response(name, content_type):
+    """
+    Hands the transfer over to the web server (nginx `X-Accel-Redirect` or Apache/lighttpd
+    `X-Sendfile`) or, with `redirect`, to the object store through a (signed) URL of the
+    storage. The web server or object store then answers ranges and conditional requests itself.
+    """
+    if STREAM_OFFLOAD == 'redirect':
+        return HttpResponseRedirect(default_storage.url(name))
+    response = HttpResponse(content_type=content_type)
+    if STREAM_OFFLOAD == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = STREAM_ACCEL_PREFIX + name
+    else:
+        response['X-Sendfile'] = default_storage.path(name)
+    return response
+
+
+def serve_file(request, name):
+    """
+    Serves a stored media file with support for byte ranges and conditional requests.
+
+    - `Range`/`If-Range` are answered with `206 Partial Content` (or `416` for ranges outside the file).
+    - `ETag`/`Last-Modified` are sent with every response, `If-None-Match`/`If-Modified-Since` return `304`.
+    - Full responses use `FileResponse`, so the WSGI server can send local files with `sendfile`.
+    - Files are read through the storage API, ranges are streamed without loading the whole file.
+      On S3 every response is streamed from a ranged `GetObject`.
+    - With `VIDEO_STREAM_OFFLOAD` set, the whole transfer is handed over to the web server or object store.
+
+    Args:
+        request (HttpRequest): The current request.
+        name (str): Name of the file in the media storage.
+    """
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if STREAM_OFFLOAD:
+        return offload_response(name, content_type)
+
+    size = default_storage.size(name)
+    last_modified = default_storage.get_modified_time(name).timestamp()
+    etag = quote_etag(f'{int(last_modified * 1000000):x}-{size:x}')
+
+    if not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        if byte_range and range_applies(request, etag, last_modified):
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(read_range(name, start, length), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(length)
+        elif s3_object(name) is not None:
+            response = StreamingHttpResponse(read_range(name, 0, size), content_type=content_type)
+            response['Content-Length'] = str(size)
+        else:
+            response = FileResponse(default_storage.open(name, 'rb'), content_type=content_type)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -1,93 +1,732 @@
 import subprocess
 import os
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
 from django.core.files import File
-from .models import Video
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from .models import Category, MediaTombstone, Video, VideoUpload
+from .cache import invalidate_catalogue
+from .garbage import (
+    MEDIA_GC_BATCH_SIZE, MEDIA_GC_SCHEDULED_KEY, bury, delete_media, referenced_names, retry_delay, schedule_media_gc,
+)
+from .progress import existing_entries, save_progress, take_buffered_progress, redis_connection
+from .processing import run_ffmpeg, set_processing_state
+from .queues import current_queue, get_queue, transcode_queue_name, transcode_timeout
+from .storage import delete_prefix, fetch, media_prefix, probe_location, store, store_directory, work_dir
+from .uploads import complete_upload
+from .previews import (
+    POSTER_FORMATS, POSTER_WIDTHS, build_poster_command, build_poster_frame_command, build_sprite_command,
+    build_thumbnail_vtt, poster_path, tile_size,
+)
+from .encoding import (
+    ENCODING_PROFILES, MEDIA_FIELDS, SEGMENT_SECONDS, SPLIT_SECONDS, adjust_profiles, analyze_complexity,
+    build_concat_command, build_rendition_command, build_segment_command, build_single_pass_command,
+    build_split_command, inspect_media, rendition_target, select_renditions,
+)
 
 
-RESOLUTIONS = {
-    "480p": {"size": "hd480", "field": "video_480p"},
-    "720p": {"size": "hd720", "field": "video_720p"},
-    "1080p": {"size": "hd1080", "field": "video_1080p"},
-}
 ALLOWED_CATEGORIES = os.environ.get('ALLOWED_CATEGORIES').split(',')
-    
+TRANSCODE_MODE = getattr(settings, 'VIDEO_TRANSCODE_MODE', 'single_pass')
+TRANSCODE_CONCURRENCY = getattr(settings, 'VIDEO_TRANSCODE_CONCURRENCY', os.cpu_count() or 1)
+PACKAGE_DASH = getattr(settings, 'VIDEO_PACKAGE_DASH', False)
 
-def convert_video(source, video_instance):
+
+def encode_rendition(source, resolution, video_instance=None, profiles=None):
+    """
+    Encodes a single rendition and returns the path of the written file. The size of the
+    source and the progress reporting are taken from `video_instance` if it is given.
+    """
+    print(f'Konvertiere {resolution}...')
+    video_id, duration, width, height = None, None, None, None
+    if video_instance is not None:
+        video_id, duration = video_instance.pk, video_instance.duration
+        width, height = video_instance.width, video_instance.height
+    run_ffmpeg(build_rendition_command(source, resolution, profiles, width, height), video_id, resolution, duration)
+    return rendition_target(source, resolution)
+
+
+def store_rendition(video_instance, resolution, target):
+    """
+    Saves an encoded rendition into its field on the `Video` model (through the media storage)
+    and removes the temporary file.
+    Only the rendition field is written, so parallel rendition jobs do not overwrite each other.
+    """
+    with open(target, 'rb') as f:
+        field_name = ENCODING_PROFILES[resolution]['field']
+        getattr(video_instance, field_name).save(os.path.basename(target), File(f), save=False)
+        video_instance.save(update_fields=[field_name])
+
+    os.remove(target)
+    print(f'{resolution} erfolgreich konvertiert und gespeichert!')
+
+
+def prepare_conversion(video_id, priority=None):
+    """
+    First, short job of a conversion. It inspects the source with ffprobe and stores duration,
+    resolution, codecs, bitrate, frame rate and audio layout on the video. On object stores ffprobe
+    reads the source through its URL, so the original is only downloaded once, by `convert_video`. Then `convert_video`
+    is enqueued on the queue which fits the video (see `transcode_queue_name`) with a timeout
+    scaled to its duration and the number of renditions.
+
+    Args:
+        video_id (int): Primary key of the video.
+        priority (str): Optional `high` (admin re-encodes) or `bulk` (imports).
+    """
+    video_instance = Video.objects.filter(pk=video_id).first()
+    if video_instance is None or not video_instance.original_file:
+        print(f'Video ID {video_id} hat keine Eingabedatei!')
+        return None
+
+    if not default_storage.exists(video_instance.original_file.name):
+        print('Die Eingabedatei existiert nicht!')
+        set_processing_state(video_id, 'failed', error='Source file does not exist.')
+        return None
+
+    try:
+        with work_dir(video_id) as tmp_dir:
+            inspect_video(video_instance, probe_location(video_instance.original_file.name, tmp_dir))
+    except Exception as e:
+        print(f'Fehler bei der Analyse des Videos: {str(e)}!')
+        set_processing_state(video_id, 'failed', error=str(e))
+        return None
+
+    queue_name = transcode_queue_name(video_instance.duration, priority)
+    renditions = len(select_renditions(video_instance.width, video_instance.height))
+    print(f'Video ID {video_id} wird in der Warteschlange {queue_name} konvertiert.')
+    return get_queue(queue_name).enqueue(
+        convert_video, video_id, job_timeout=transcode_timeout(video_instance.duration, renditions))
+
+
+def convert_video(video_id):
     """
-    Converts a given video file into multiple resolutions (defined in RESOLUTIONS) 
-    and saves the converted videos into the associated fields of the provided `video_instance`.
+    Converts the original file of a video into multiple resolutions (defined in `VIDEO_ENCODING_PROFILES`)
+    and saves the converted videos into the associated fields of the `Video`.
 
+    - The job only receives the primary key and loads the current row from the database,
+      so it never works on a stale copy of the video.
+    - All files go through the storage API (local or S3). The job works on a copy of the source in
+      a temporary directory, so any worker can process any video.
     - It takes the original video (source file), converts it into different resolutions using `ffmpeg`,
       and stores the resulting files in the appropriate fields on the `Video` model.
+      Only the changed fields are written (`update_fields`), concurrent edits of other fields are kept.
+    - The source has been inspected by `prepare_conversion`. Only renditions at or below the
+      resolution of the source are made (no upscaling, the aspect ratio is kept).
+    - All follow-up jobs are enqueued on the queue of this job, so the conversion keeps its priority.
+    - With `VIDEO_PER_TITLE_ENCODING` a few samples of the source are analysed first and the
+      profiles (CRF, rate caps) are adjusted to the complexity of the content.
+    - How the renditions are encoded depends on `VIDEO_TRANSCODE_MODE`:
+        - `single_pass`: one ffmpeg run decodes the source once and writes all renditions.
+        - `pool`: one ffmpeg run per rendition, up to `VIDEO_TRANSCODE_CONCURRENCY` at the same time.
+        - `jobs`: one RQ job per rendition plus a final job which waits for all of them.
+        - `segmented`: the source is cut at keyframes into pieces of `VIDEO_SPLIT_SECONDS`, every
+          (piece, rendition) pair is encoded in its own RQ job and a final job joins the pieces.
+        - `sequential`: one ffmpeg run per rendition, one after another.
     - The original file is deleted after the conversion, and the category of the video is set.
+    - The progress (percent, current rendition, fps, speed and ETA) is published to Redis
+      and can be read through the `processing-status` action of the video API.
     """
-    if not os.path.isfile(source):
-        print(f'Die Eingabedatei existiert nicht!')
+    video_instance = Video.objects.filter(pk=video_id).first()
+    if video_instance is None or not video_instance.original_file:
+        print(f'Video ID {video_id} hat keine Eingabedatei!')
+        return None
+
+    if not default_storage.exists(video_instance.original_file.name):
+        print('Die Eingabedatei existiert nicht!')
+        set_processing_state(video_id, 'failed', error='Source file does not exist.')
         return None
 
+    with work_dir(video_id) as tmp_dir:
+        return transcode(video_instance, fetch(video_instance.original_file.name, tmp_dir))
+
+
+def transcode(video_instance, source):
+    """
+    Encodes the renditions of a video from the local copy of its source according to
+    `VIDEO_TRANSCODE_MODE` (see `convert_video`).
+    """
+    video_id = video_instance.pk
+    duration = video_instance.duration
+    resolutions = select_renditions(video_instance.width, video_instance.height)
+    complexity = analyze_complexity(source, duration)
+    profiles = adjust_profiles(complexity)
+
+    if TRANSCODE_MODE == 'jobs':
+        set_processing_state(video_id, 'transcoding', renditions={resolution: 0.0 for resolution in resolutions})
+        return enqueue_rendition_jobs(video_instance, resolutions, complexity)
+
+    if TRANSCODE_MODE == 'segmented':
+        try:
+            return enqueue_segment_jobs(video_instance, source, resolutions, complexity)
+        except Exception as e:
+            print(f'Fehler beim Zerlegen des Videos: {str(e)}!')
+            set_processing_state(video_id, 'failed', error=str(e))
+            return None
+
     try:
-        for resolution, config in RESOLUTIONS.items():
-            file, _ = os.path.splitext(source)
-            target = file + f'_{resolution}.mp4'
+        if TRANSCODE_MODE == 'single_pass':
+            label = ', '.join(resolutions)
+            set_processing_state(video_id, 'transcoding', renditions={label: 0.0})
+            print(f'Konvertiere {label} in einem Durchlauf...')
+            cmd = build_single_pass_command(source, resolutions, profiles, video_instance.width, video_instance.height)
+            run_ffmpeg(cmd, video_id, label, duration)
+            targets = [rendition_target(source, resolution) for resolution in resolutions]
+        elif TRANSCODE_MODE == 'pool':
+            set_processing_state(video_id, 'transcoding', renditions={resolution: 0.0 for resolution in resolutions})
+            with ThreadPoolExecutor(max_workers=TRANSCODE_CONCURRENCY) as executor:
+                targets = list(executor.map(lambda resolution: encode_rendition(source, resolution, video_instance, profiles), resolutions))
+        else:
+            set_processing_state(video_id, 'transcoding', renditions={resolution: 0.0 for resolution in resolutions})
+            targets = [encode_rendition(source, resolution, video_instance, profiles) for resolution in resolutions]
+
+        for resolution, target in zip(resolutions, targets):
+            store_rendition(video_instance, resolution, target)
 
-            cmd = f'ffmpeg -i "{source}" -s {config["size"]} -c:v libx264 -crf 23 -c:a aac -strict -2 "{target}"'
-            print(f'Konvertiere {resolution}...')
+        return finish_conversion(video_instance)
 
-            subprocess.run(cmd, capture_output=False, shell=True, check=True)
+    except Exception as e:
+        print(f'Fehler bei der Verarbeitung der Videos: {str(e)}!')
+        set_processing_state(video_id, 'failed', error=str(e))
+        return None
 
-            with open(target, 'rb') as f:
-                field_name = config['field']
-                getattr(video_instance, field_name).save(os.path.basename(target), File(f), save=True)
 
-            os.remove(target)
-            print(f'{resolution} erfolgreich konvertiert und gespeichert!')
+def inspect_video(video_instance, source):
+    """
+    Reads the media metadata of the source with ffprobe and stores it on the video.
+    """
+    for field, value in inspect_media(source).items():
+        setattr(video_instance, field, value)
+    video_instance.save(update_fields=MEDIA_FIELDS)
+    print(f'Video ID {video_instance.pk}: {video_instance.width}x{video_instance.height}, {video_instance.video_codec}, {video_instance.duration}s')
 
-        os.remove(source)
-        video_instance.original_file.delete(save=False)
 
-        set_video_category(video_instance)
+def enqueue_rendition_jobs(video_instance, resolutions, complexity=None):
+    """
+    Spreads the renditions of one video across several RQ jobs. The final job depends on
+    all rendition jobs and only runs after every one of them has finished.
+    """
+    queue = current_queue()
+    timeout = transcode_timeout(video_instance.duration)
+    jobs = [
+        queue.enqueue(convert_rendition, video_instance.pk, resolution, complexity, job_timeout=timeout)
+        for resolution in resolutions
+    ]
+    return queue.enqueue(finish_rendition_jobs, video_instance.pk, depends_on=jobs)
 
-        video_instance.save()
-        print(f'Alle Auflösungen wurden konvertiert und gespeichert!')
+
+def convert_rendition(video_id, resolution, complexity=None):
+    """
+    RQ job which encodes and stores one rendition of a video with the profiles of the given complexity.
+    """
+    video_instance = Video.objects.get(pk=video_id)
+    with work_dir(video_id) as tmp_dir:
+        try:
+            source = fetch(video_instance.original_file.name, tmp_dir)
+            target = encode_rendition(source, resolution, video_instance, adjust_profiles(complexity))
+        except Exception as e:
+            set_processing_state(video_id, 'failed', error=str(e))
+            raise
+        store_rendition(video_instance, resolution, target)
+
+
+def finish_rendition_jobs(video_id):
+    """
+    RQ job which finishes a conversion after all rendition jobs are done.
+    """
+    return finish_conversion(Video.objects.get(pk=video_id))
+
+
+def segment_label(resolution, segment):
+    """
+    Returns the name under which the progress of one piece of a rendition is published.
+    """
+    index = os.path.splitext(os.path.basename(segment))[0].rsplit('_', 1)[-1]
+    return f'{resolution} #{int(index) + 1}'
+
+
+def enqueue_segment_jobs(video_instance, source, resolutions, complexity=None):
+    """
+    Cuts the source into pieces and enqueues one RQ job per (piece, rendition) pair, so a long
+    video is spread across all idle workers. The stitch job depends on all of them and only runs
+    after every piece has been encoded. The pieces are put into the storage below
+    `videos/segments/<id>/`, so every worker can fetch them.
+    """
+    video_id = video_instance.pk
+    segment_dir = os.path.join(os.path.dirname(source), 'segments')
+    os.makedirs(segment_dir)
+    print(f'Zerlege Video ID {video_id} in Abschnitte von {SPLIT_SECONDS} Sekunden...')
+    subprocess.run(build_split_command(source, segment_dir), capture_output=True, check=True)
+    segments = sorted(store_directory(segment_dir, media_prefix('segments', video_id)))
+
+    set_processing_state(video_id, 'transcoding', renditions={
+        segment_label(resolution, segment): 0.0 for resolution in resolutions for segment in segments
+    })
+    queue = current_queue()
+    jobs = [
+        queue.enqueue(convert_segment, video_id, segment, resolution, complexity, job_timeout=transcode_timeout(SPLIT_SECONDS))
+        for segment in segments for resolution in resolutions
+    ]
+    return queue.enqueue(
+        stitch_segments, video_id, segments, resolutions,
+        depends_on=jobs, job_timeout=transcode_timeout(video_instance.duration),
+    )
+
+
+def convert_segment(video_id, segment, resolution, complexity=None):
+    """
+    RQ job which encodes one rendition of one piece of the source and stores it next to the piece.
+    """
+    video_instance = Video.objects.get(pk=video_id)
+    with work_dir(video_id) as tmp_dir:
+        try:
+            local_segment = fetch(segment, tmp_dir)
+            cmd = build_segment_command(local_segment, resolution, adjust_profiles(complexity), video_instance.width, video_instance.height)
+            run_ffmpeg(cmd, video_id, segment_label(resolution, segment), SPLIT_SECONDS)
+        except Exception as e:
+            set_processing_state(video_id, 'failed', error=str(e))
+            raise
+        return store(rendition_target(local_segment, resolution), rendition_target(segment, resolution))
+
+
+def stitch_segments(video_id, segments, resolutions):
+    """
+    RQ job which joins the encoded pieces of every rendition, adds the audio of the source,
+    stores the renditions on the `Video` and removes the pieces afterwards.
+    """
+    video_instance = Video.objects.get(pk=video_id)
+    with work_dir(video_id) as tmp_dir:
+        source = fetch(video_instance.original_file.name, tmp_dir)
+        for resolution in resolutions:
+            list_path = os.path.join(tmp_dir, f'{resolution}.txt')
+            with open(list_path, 'w') as f:
+                for segment in segments:
+                    path = fetch(rendition_target(segment, resolution), tmp_dir).replace("'", "'\\''")
+                    f.write(f"file '{path}'\n")
+
+            print(f'Füge {resolution} zusammen...')
+            target = rendition_target(source, resolution)
+            try:
+                subprocess.run(build_concat_command(list_path, source, target, ENCODING_PROFILES[resolution]), capture_output=True, check=True)
+            except Exception as e:
+                set_processing_state(video_id, 'failed', error=str(e))
+                raise
+            store_rendition(video_instance, resolution, target)
+
+    delete_prefix(media_prefix('segments', video_id))
+    return finish_conversion(video_instance)
+
+
+def finish_conversion(video_instance):
+    """
+    Releases the original file and sets the category once all renditions are stored. The original
+    gets a tombstone in the same transaction as the cleared field, the garbage collection deletes it.
+    The packaging, the scrub previews and (without uploaded thumbnail) a poster frame are enqueued as the next stages.
+    They are enqueued before the category is set: the original is gone at this point, so a failing
+    category lookup must not keep the video from being packaged.
+    If a step fails, the processing state becomes `failed` and the error is raised again.
+    """
+    try:
+        with transaction.atomic():
+            original_name = video_instance.original_file.name
+            video_instance.original_file = None
+            video_instance.save(update_fields=['original_file'])
+            bury([original_name])
+        print('Alle Auflösungen wurden konvertiert und gespeichert!')
+
+        set_processing_state(video_instance.pk, 'packaging', rendition=None)
+        queue = current_queue()
+        queue.enqueue(package_video, video_instance.pk, job_timeout=transcode_timeout(video_instance.duration))
+        queue.enqueue(generate_previews, video_instance.pk, job_timeout=transcode_timeout(video_instance.duration))
+        if not video_instance.thumbnail:
+            queue.enqueue(extract_poster, video_instance.pk)
+
+        try:
+            set_video_category(video_instance)
+        except Exception as e:
+            print(f'Kategorie für Video ID {video_instance.pk} konnte nicht gesetzt werden: {e}')
         return video_instance
+    except Exception as e:
+        print(f'Fehler beim Abschluss der Konvertierung: {str(e)}!')
+        set_processing_state(video_instance.pk, 'failed', error=str(e))
+        raise
+
+
+def has_audio_stream(path):
+    """
+    Checks with ffprobe whether the given media file contains an audio stream.
+    """
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'a', '-show_entries', 'stream=index', '-of', 'csv=p=0', path],
+        capture_output=True, text=True, check=True,
+    )
+    return bool(result.stdout.strip())
+
 
+def build_stream_maps(inputs, with_audio):
+    """
+    Returns the input and map arguments which take the video (and audio) stream of every rendition.
+    """
+    cmd = []
+    for path in inputs:
+        cmd += ['-i', path]
+    for index in range(len(inputs)):
+        cmd += ['-map', f'{index}:v']
+        if with_audio:
+            cmd += ['-map', f'{index}:a']
+    return cmd
+
+
+def build_hls_command(renditions, output_dir, with_audio):
+    """
+    Builds the ffmpeg command which packages the already encoded renditions into HLS.
+
+    The renditions are only remuxed (`-c copy`). Because every rendition was encoded with
+    keyframes on the segment boundaries, the segments of all renditions are aligned and
+    players can switch quality between two segments.
+
+    Args:
+        renditions (list): Tuples of (resolution, path) of the encoded renditions.
+        output_dir (str): Directory which receives `master.m3u8` and one folder per rendition.
+        with_audio (bool): Whether the renditions contain an audio stream.
+    """
+    stream_map = []
+    for index, (resolution, _) in enumerate(renditions):
+        stream = f'v:{index},a:{index}' if with_audio else f'v:{index}'
+        stream_map.append(f'{stream},name:{resolution}')
+
+    return [
+        'ffmpeg', '-y', *build_stream_maps([path for _, path in renditions], with_audio),
+        '-c', 'copy', '-f', 'hls',
+        '-hls_time', str(SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(output_dir, '%v', 'segment_%05d.ts'),
+        '-master_pl_name', 'master.m3u8',
+        '-var_stream_map', ' '.join(stream_map),
+        os.path.join(output_dir, '%v', 'index.m3u8'),
+    ]
+
+
+def build_dash_command(renditions, output_dir, with_audio):
+    """
+    Builds the ffmpeg command which packages the already encoded renditions into DASH.
+    """
+    adaptation_sets = 'id=0,streams=v id=1,streams=a' if with_audio else 'id=0,streams=v'
+    return [
+        'ffmpeg', '-y', *build_stream_maps([path for _, path in renditions], with_audio),
+        '-c', 'copy', '-f', 'dash',
+        '-seg_duration', str(SEGMENT_SECONDS), '-use_template', '1', '-use_timeline', '1',
+        '-adaptation_sets', adaptation_sets,
+        os.path.join(output_dir, 'manifest.mpd'),
+    ]
+
+
+def package_video(video_id):
+    """
+    Packages the converted renditions of a video into segmented HLS (and optionally DASH) output.
+
+    - Writes a master playlist, one playlist per rendition and the aligned segments
+      to `videos/hls/<id>/` (and the DASH manifest to `videos/dash/<id>/`) of the media storage.
+    - Stores the path of the master playlist and of the manifest on the `Video` model.
+    - If packaging fails, the processing state becomes `failed` and the error is raised again,
+      so RQ keeps the job as failed.
+    """
+    try:
+        video_instance = Video.objects.get(pk=video_id)
+        fields = [
+            (resolution, getattr(video_instance, config['field'])) for resolution, config in ENCODING_PROFILES.items()
+            if getattr(video_instance, config['field'])
+        ]
+        if not fields:
+            print(f'Keine Auflösungen zum Verpacken für Video ID {video_id} gefunden.')
+            set_processing_state(video_id, 'failed', error='No renditions to package.')
+            return None
+
+        update_fields = ['hls_playlist']
+        with work_dir(video_id) as tmp_dir:
+            renditions = [(resolution, fetch(video_field.name, tmp_dir)) for resolution, video_field in fields]
+            if video_instance.audio_channels is not None:
+                with_audio = video_instance.audio_channels > 0
+            else:
+                with_audio = has_audio_stream(renditions[0][1])
+
+            hls_dir = os.path.join(tmp_dir, 'hls')
+            os.makedirs(hls_dir)
+            print('Erstelle HLS Playlists...')
+            subprocess.run(build_hls_command(renditions, hls_dir, with_audio), check=True)
+            store_directory(hls_dir, media_prefix('hls', video_id))
+            video_instance.hls_playlist.name = f'{media_prefix("hls", video_id)}/master.m3u8'
+
+            if PACKAGE_DASH:
+                dash_dir = os.path.join(tmp_dir, 'dash')
+                os.makedirs(dash_dir)
+                print('Erstelle DASH Manifest...')
+                subprocess.run(build_dash_command(renditions, dash_dir, with_audio), check=True)
+                store_directory(dash_dir, media_prefix('dash', video_id))
+                video_instance.dash_manifest.name = f'{media_prefix("dash", video_id)}/manifest.mpd'
+                update_fields.append('dash_manifest')
+
+        video_instance.save(update_fields=update_fields)
+        set_processing_state(video_id, 'done')
+        print(f'Streaming Pakete für Video ID {video_id} gespeichert!')
+        return video_instance
     except Exception as e:
-        print(f'Fehler bei der Verarbeitung der Videos: {str(e)}!')
+        print(f'Fehler beim Verpacken des Videos: {str(e)}!')
+        set_processing_state(video_id, 'failed', error=str(e))
+        raise
+
+
+def generate_previews(video_id):
+    """
+    Generates the scrub previews of a video.
+
+    - One ffmpeg pass over the smallest rendition takes a frame every `VIDEO_PREVIEW_INTERVAL`
+      seconds and tiles the frames into JPEG sprite sheets.
+    - A WebVTT thumbnail track maps every time range to its tile, players show the tile while scrubbing.
+    - The files are stored below `videos/previews/<id>/`, the track is stored on the `Video` model.
+    """
+    video_instance = Video.objects.get(pk=video_id)
+    source_name = next((
+        getattr(video_instance, config['field']).name for config in ENCODING_PROFILES.values()
+        if getattr(video_instance, config['field'])
+    ), None)
+    if source_name is None or not video_instance.duration:
+        print(f'Keine Vorschaubilder für Video ID {video_id} möglich.')
         return None
-    
+
+    with work_dir(video_id) as tmp_dir:
+        source = fetch(source_name, tmp_dir)
+        preview_dir = os.path.join(tmp_dir, 'previews')
+        os.makedirs(preview_dir)
+        tile = tile_size(video_instance.width, video_instance.height)
+        print('Erstelle Vorschaubilder...')
+        subprocess.run(build_sprite_command(source, preview_dir, tile), capture_output=True, check=True)
+
+        with open(os.path.join(preview_dir, 'thumbnails.vtt'), 'w') as f:
+            f.write(build_thumbnail_vtt(video_instance.duration, tile))
+        store_directory(preview_dir, media_prefix('previews', video_id))
+
+    video_instance.preview_track.name = f'{media_prefix("previews", video_id)}/thumbnails.vtt'
+    video_instance.save(update_fields=['preview_track'])
+    print(f'Vorschaubilder für Video ID {video_id} gespeichert!')
+    return video_instance
+
+
+def generate_posters(video_id):
+    """
+    Generates the responsive poster variants of a video from its thumbnail.
+
+    - Every format of `VIDEO_POSTER_FORMATS` (AVIF, WebP, JPEG) is written at every width of
+      `VIDEO_POSTER_WIDTHS` up to the width of the thumbnail, one ffmpeg run per format.
+    - A format which the installed ffmpeg can not encode is skipped.
+    - The paths are stored as {format: {width: path}} in `poster_variants`, together with the
+      name of the thumbnail they were made from.
+    """
+    video_instance = Video.objects.get(pk=video_id)
+    if not video_instance.thumbnail:
+        return None
+
+    prefix = media_prefix('posters', video_id)
+    variants = {'source': video_instance.thumbnail.name}
+    with work_dir(video_id) as tmp_dir:
+        source = fetch(video_instance.thumbnail.name, tmp_dir)
+        image_width = inspect_media(source)['width']
+        widths = [width for width in POSTER_WIDTHS if not image_width or width <= image_width] or [image_width]
+
+        poster_dir = os.path.join(tmp_dir, 'posters')
+        os.makedirs(poster_dir)
+        for image_format in POSTER_FORMATS:
+            try:
+                subprocess.run(build_poster_command(source, poster_dir, image_format, widths), capture_output=True, check=True)
+            except subprocess.CalledProcessError as e:
+                print(f'Poster im Format {image_format} fehlgeschlagen: {str(e)}')
+                continue
+            variants[image_format] = {
+                str(width): f'{prefix}/{os.path.basename(poster_path(poster_dir, image_format, width))}' for width in widths
+            }
+        store_directory(poster_dir, prefix)
+
+    video_instance.poster_variants = variants
+    video_instance.save(update_fields=['poster_variants'])
+    print(f'Poster für Video ID {video_id} gespeichert!')
+    return video_instance
+
+
+def extract_poster(video_id):
+    """
+    Extracts a poster frame from the largest rendition of a video without uploaded thumbnail
+    and stores it as thumbnail. Saving the thumbnail starts the generation of the poster variants.
+    """
+    video_instance = Video.objects.get(pk=video_id)
+    source_name = next((
+        getattr(video_instance, config['field']).name for config in reversed(ENCODING_PROFILES.values())
+        if getattr(video_instance, config['field'])
+    ), None)
+    if video_instance.thumbnail or source_name is None:
+        return None
+
+    with work_dir(video_id) as tmp_dir:
+        source = fetch(source_name, tmp_dir)
+        target = os.path.join(tmp_dir, f'poster_{video_id}.jpg')
+        subprocess.run(build_poster_frame_command(source, video_instance.duration, target), capture_output=True, check=True)
+        with open(target, 'rb') as f:
+            video_instance.thumbnail.save(os.path.basename(target), File(f), save=False)
+            video_instance.save(update_fields=['thumbnail'])
+    print(f'Posterbild für Video ID {video_id} extrahiert!')
+    return video_instance
+
+
+def assemble_upload(upload_id):
+    """
+    Joins the chunks of a finished resumable upload into the original file and creates the `Video`,
+    see `complete_upload`. Cancelled or already assembled uploads are skipped.
+    """
+    upload = VideoUpload.objects.filter(pk=upload_id, video__isnull=True).first()
+    if upload is None:
+        print(f'Upload {upload_id} nicht gefunden oder bereits zusammengesetzt.')
+        return None
+    video_instance = complete_upload(upload)
+    print(f'Upload {upload_id} zusammengesetzt, Video ID {video_instance.pk} erstellt!')
+    return video_instance
+
+
+def flush_progress_buffer():
+    """
+    Periodic RQ job which writes the buffered watch positions to the database in batches
+    and removes them from Redis afterwards. Positions of deleted videos or users are dropped.
+    The moved buffer is removed even if saving fails, so one broken batch does not block
+    every later flush.
+    """
+    flushing_key, entries = take_buffered_progress()
+    try:
+        entries = existing_entries(entries)
+        if entries:
+            save_progress(entries)
+    finally:
+        redis_connection().delete(flushing_key)
+    print(f'{len(entries)} Fortschritte gespeichert.')
+    return len(entries)
+
+
+def collect_media_batch(after_id):
+    """
+    Deletes the files of up to `VIDEO_MEDIA_GC_BATCH_SIZE` due tombstones with an id above `after_id`.
+
+    The rows are locked with `SKIP LOCKED`, so two collection jobs never work on the same files.
+    Files which are referenced by a video again are kept. A tombstone is removed once its file
+    is gone, a failed deletion is retried later with an exponential backoff.
+
+    Returns:
+        tuple: The last processed id (None if the batch was empty), number of deleted and of failed tombstones.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            MediaTombstone.objects.select_for_update(skip_locked=True)
+            .filter(id__gt=after_id, next_attempt_at__lte=now).order_by('id')[:MEDIA_GC_BATCH_SIZE]
+        )
+        if not batch:
+            return None, 0, 0
+
+        referenced = referenced_names([tombstone.name for tombstone in batch if not tombstone.is_prefix])
+        done, failed = [], []
+        for tombstone in batch:
+            try:
+                if tombstone.is_prefix or tombstone.name not in referenced:
+                    delete_media(tombstone)
+            except Exception as e:
+                tombstone.attempts += 1
+                tombstone.last_error = str(e)
+                tombstone.next_attempt_at = now + retry_delay(tombstone.attempts)
+                failed.append(tombstone)
+            else:
+                done.append(tombstone.id)
+
+        MediaTombstone.objects.filter(id__in=done).delete()
+        MediaTombstone.objects.bulk_update(failed, ['attempts', 'last_error', 'next_attempt_at'])
+    return batch[-1].id, len(done), len(failed)
+
+
+def collect_media_garbage():
+    """
+    RQ job on the `maintenance` queue which deletes the files of all due tombstones in batches.
+    For tombstones which are still waiting afterwards (failed deletions) the next run is scheduled.
+    """
+    cache.delete(MEDIA_GC_SCHEDULED_KEY)
+    last_id, total_done, total_failed = 0, 0, 0
+    while True:
+        last_id, done, failed = collect_media_batch(last_id)
+        if last_id is None:
+            break
+        total_done += done
+        total_failed += failed
+
+    next_tombstone = MediaTombstone.objects.order_by('next_attempt_at').first()
+    if next_tombstone is not None:
+        schedule_media_gc(max(next_tombstone.next_attempt_at - timezone.now(), timedelta(0)))
+    print(f'{total_done} Dateien gelöscht, {total_failed} fehlgeschlagen.')
+    return total_done
+
 
 def set_video_category_for_all():
     """
-    Sets the category for all videos in the database by calling `set_video_category` 
-    for each video instance.
+    Sets the category of all videos without one from the filenames of their thumbnails.
+    The categories are looked up once and the videos are updated with `bulk_update`,
+    so the catalogue is invalidated once afterwards.
     """
-    videos = Video.objects.all()
-    for video in videos:
-        set_video_category(video)
+    categories = {}
+    videos = []
+    for video in Video.objects.filter(category__isnull=True).exclude(thumbnail='').exclude(thumbnail__isnull=True).only('id', 'thumbnail'):
+        name = extract_category_from_filename(video.thumbnail.name)
+        if name:
+            if name not in categories:
+                categories[name] = get_category(name)
+            video.category = categories[name]
+            videos.append(video)
+
+    Video.objects.bulk_update(videos, ['category'], batch_size=500)
+    invalidate_catalogue()
+    print(f'Kategorie für {len(videos)} Videos gespeichert.')
+    return len(videos)
 
 
 def extract_category_from_filename(filename):
     """
-    Extracts a category from the filename of a video thumbnail.
+    Extracts a category from the filename of a video thumbnail. Returns None without filename.
     """
+    if not filename:
+        return None
+    filename = os.path.basename(filename).lower()
     for category in ALLOWED_CATEGORIES:
-        if category in filename.lower():
+        if category in filename:
             return category
     return None
 
 
+def get_category(name):
+    """
+    Returns the `Category` with the given name and creates it on first use.
+    """
+    return Category.objects.get_or_create(name=name)[0]
+
+
 def set_video_category(video_instance):
     """
     Sets the category for a given `video_instance` based on the filename of its thumbnail.
+    Videos without thumbnail (API and resumable uploads) are skipped.
     """
-    filename = video_instance.thumbnail.name
+    filename = video_instance.thumbnail.name if video_instance.thumbnail else None
+    if not filename:
+        print(f"Kein Thumbnail für Video ID {video_instance.id}, keine Kategorie gesetzt.")
+        return
     print(f"Thumbnail Dateiname: {filename}")
 
     category = extract_category_from_filename(filename)
-    
+
     if category:
-        video_instance.category = category
-        video_instance.save()
+        video_instance.category = get_category(category)
+        video_instance.save(update_fields=['category'])
         print(f"Kategorie \"{category}\" für Video ID {video_instance.id} gespeichert.")
     else:
-        print(f"Keine gültige Kategorie im Thumbnail für Video ID {video_instance.id} gefunden.")
\ No newline at end of file
+        print(f"Keine gültige Kategorie im Thumbnail für Video ID {video_instance.id} gefunden.")
@@ -2,10 +2,84 @@ from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.authtoken.models import Token
+from users.models import AuthToken
+from django.core.files.storage import default_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, override_settings
+from unittest import mock, skipUnless
+from videoflix_app.models import Category, MediaTombstone, Video, VideoProgress
+from videoflix_app.cache import invalidate_catalogue
+import base64
+import io
+import json
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+from videoflix_app.tasks import (
+    assemble_upload, build_hls_command, collect_media_garbage, extract_poster, finish_conversion, flush_progress_buffer,
+    generate_previews, package_video, prepare_conversion, set_video_category_for_all,
+)
+from videoflix_app.garbage import MEDIA_GC_SCHEDULED_KEY
+from videoflix_app.encoding import (
+    build_single_pass_command, adjust_profiles, encoder_args, parse_probe, select_renditions, scale_filter,
+    build_split_command, build_segment_command, build_concat_command,
+)
+from videoflix_app.processing import get_processing_status, parse_progress_block, publish_progress, set_processing_state
+from videoflix_app.queues import transcode_queue_name, transcode_timeout
+from videoflix_app.search import search_query
+from django.contrib.postgres.search import SearchQuery
+from videoflix_app.previews import build_thumbnail_vtt, tile_size, build_poster_command
+from videoflix_app.storage import PackageStorage, delete_prefix, fetch, media_prefix, probe_location, store_directory, work_dir
 
 
 User = get_user_model()
+OBJECT_STORAGES = {
+    'default': {'BACKEND': 'videoflix_app.storage.LocalObjectStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class TempMediaRootMixin:
+    """
+    Runs every test with its own temporary MEDIA_ROOT, which is removed afterwards.
+    """
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+
+class FakeRedis:
+    """
+    Stand-in for the hash commands the heartbeat buffer uses on the Redis connection.
+    """
+    def __init__(self):
+        self.hashes = {}
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field.encode()] = str(value).encode()
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field.encode())
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def exists(self, key):
+        return int(key in self.hashes)
+
+    def rename(self, key, new_key):
+        self.hashes[new_key] = self.hashes.pop(key)
+
+    def delete(self, key):
+        self.hashes.pop(key, None)
 
 
 class VideoTest(APITestCase):
@@ -17,9 +91,10 @@ class VideoTest(APITestCase):
         self.user = User.objects.create_user(
             username='user@test.de', password='testpassword', email='user@test.de', is_email_verified=True)
         
-        self.token = Token.objects.create(user=self.user)
+        self.token = AuthToken.objects.create(user=self.user)
         
         self.client = APIClient()
+        invalidate_catalogue()
 
 
     def test_list_video_unauthenticated(self):
@@ -40,6 +115,152 @@ class VideoTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+    def test_list_video_paginated(self):
+        url = reverse('video-list')
+        for title in ['First', 'Second']:
+            Video.objects.create(title=title, description=title, original_file=f'videos/originals/{title}.mp4')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.get(url, {'page_size': 1})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['title'], 'Second')
+        self.assertIsNotNone(response.data['next'])
+
+
+    def test_list_video_cache_invalidated_on_save(self):
+        url = reverse('video-list')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.assertEqual(self.client.get(url).data, [])
+
+        Video.objects.create(title='New', description='New', original_file='videos/originals/new.mp4')
+        response = self.client.get(url)
+
+        self.assertEqual([video['title'] for video in response.data], ['New'])
+
+
+    def test_list_video_filtered_by_category(self):
+        crime, sports = Category.objects.create(name='crime'), Category.objects.create(name='sports')
+        Video.objects.create(title='Crime', description='Crime', category=crime)
+        Video.objects.create(title='Sports', description='Sports', category=sports)
+        Video.objects.create(title='Other', description='Other')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.get(reverse('video-list'), {'category': 'crime'})
+
+        self.assertEqual([(video['title'], video['category']) for video in response.data], [('Crime', 'crime')])
+
+
+    def test_category_counts(self):
+        crime = Category.objects.create(name='crime')
+        Category.objects.create(name='sports')
+        for title in ['First', 'Second']:
+            Video.objects.create(title=title, description=title, category=crime)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('video-categories'))
+
+        self.assertEqual(response.data, [{'name': 'crime', 'count': 2}, {'name': 'sports', 'count': 0}])
+
+
+    def test_set_video_category_for_all(self):
+        Video.objects.create(title='Crime', description='Crime', thumbnail='img/police_crime.png')
+        Video.objects.create(title='None', description='None', thumbnail='img/unknown.png')
+
+        self.assertEqual(set_video_category_for_all(), 1)
+
+        self.assertEqual(Video.objects.get(title='Crime').category.name, 'crime')
+        self.assertIsNone(Video.objects.get(title='None').category)
+
+
+    def test_finish_conversion_without_thumbnail(self):
+        video = Video.objects.create(title='Upload', description='Upload', original_file='videos/originals/missing_upload.mp4')
+
+        with mock.patch('videoflix_app.tasks.current_queue') as current_queue:
+            finish_conversion(video)
+
+        video.refresh_from_db()
+        self.assertFalse(video.original_file)
+        self.assertIsNone(video.category)
+        self.assertEqual(list(MediaTombstone.objects.values_list('name', flat=True)), ['videos/originals/missing_upload.mp4'])
+        enqueued = [call.args[0] for call in current_queue.return_value.enqueue.call_args_list]
+        self.assertEqual(enqueued, [package_video, generate_previews, extract_poster])
+
+    def test_finish_conversion_category_error_does_not_block_packaging(self):
+        video = Video.objects.create(title='Upload', description='Upload', original_file='videos/originals/missing_upload.mp4')
+
+        with mock.patch('videoflix_app.tasks.current_queue') as current_queue, \
+                mock.patch('videoflix_app.tasks.set_video_category', side_effect=RuntimeError('cache down')):
+            finish_conversion(video)
+
+        enqueued = [call.args[0] for call in current_queue.return_value.enqueue.call_args_list]
+        self.assertEqual(enqueued, [package_video, generate_previews, extract_poster])
+
+
+    def test_list_video_poster_srcset(self):
+        Video.objects.create(title='New', description='New', poster_variants={
+            'source': 'img/new.png',
+            'webp': {'640': 'videos/posters/1/poster_640.webp', '320': 'videos/posters/1/poster_320.webp'},
+        })
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.get(reverse('video-list'))
+
+        self.assertEqual(response.data[0]['poster_srcset'], {
+            'webp': '/media/videos/posters/1/poster_320.webp 320w, /media/videos/posters/1/poster_640.webp 640w',
+        })
+
+
+    def test_posters_enqueued_when_thumbnail_changes(self):
+        with mock.patch('videoflix_app.signals.enqueue_posters') as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                video = Video.objects.create(title='New', description='New', thumbnail='img/new_sports.png')
+            enqueue.assert_called_once_with(video.pk)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                video.poster_variants = {'source': 'img/new_sports.png'}
+                video.save()
+            enqueue.assert_called_once()
+
+
+    def test_conversion_enqueued_with_primary_key_on_commit(self):
+        with mock.patch('videoflix_app.queues.django_rq') as django_rq:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                video = Video.objects.create(title='New', description='New', original_file='videos/originals/new.mp4')
+            django_rq.get_queue.return_value.enqueue.assert_not_called()
+
+            for callback in callbacks:
+                callback()
+
+        django_rq.get_queue.assert_called_once_with('transcode-high', autocommit=True)
+        django_rq.get_queue.return_value.enqueue.assert_called_once_with(prepare_conversion, video.pk, None)
+
+
+    def test_retrieve_video_invalid_pk(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.get(reverse('video-detail', kwargs={'pk': 'abc'}))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+    def test_processing_status(self):
+        video = Video.objects.create(title='New', description='New', original_file='videos/originals/new.mp4')
+        set_processing_state(video.pk, 'transcoding', renditions={'480p': 0.0, '720p': 0.0})
+        publish_progress(video.pk, '480p', 80.0, 90.0, 3.0, 10)
+        publish_progress(video.pk, '720p', 40.0, 50.0, 2.0, 30)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.get(reverse('video-processing-status', kwargs={'pk': video.pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['state'], 'transcoding')
+        self.assertEqual(response.data['rendition'], '720p')
+        self.assertEqual(response.data['eta'], 30)
+        self.assertEqual(response.data['renditions'], {'480p': 80.0, '720p': 40.0})
+        self.assertEqual(response.data['percent'], 60.0)
+
+
     def test_video_progress_unauthenticated(self):
         url = reverse('video-progress-list')
 
@@ -55,4 +276,565 @@ class VideoTest(APITestCase):
         self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
         response = self.client.get(url)
 
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+    def test_video_progress_upsert(self):
+        url = reverse('video-progress-list')
+        video = Video.objects.create(title='Clip', description='Clip', original_file='videos/originals/clip.mp4')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.client.post(url, {'video': video.id, 'current_time': 10}, format='json')
+        response = self.client.post(url, {'video': video.id, 'current_time': 25.5}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(VideoProgress.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(VideoProgress.objects.get(user=self.user).current_time, 25.5)
+
+
+    def test_video_progress_heartbeat(self):
+        url = reverse('video-progress-heartbeat')
+        video = Video.objects.create(title='Clip', description='Clip', original_file='videos/originals/clip.mp4')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.post(url, {'video': video.id, 'current_time': 42}, format='json')
+        progress = self.client.get(reverse('video-progress-get-user-progress'), {'video': video.id})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(progress.data['current_time'], 42)
+
+
+    def test_package_video_failure_sets_failed_state(self):
+        video = Video.objects.create(
+            title='Clip', description='Clip', video_480p='videos/480p/missing_480p.mp4', audio_channels=2)
+
+        with mock.patch('videoflix_app.tasks.subprocess.run', side_effect=subprocess.CalledProcessError(1, 'ffmpeg')), \
+                self.assertRaises(subprocess.CalledProcessError):
+            package_video(video.pk)
+
+        self.assertEqual(get_processing_status(video.pk)['state'], 'failed')
+
+
+    def test_video_progress_buffered_flush(self):
+        url = reverse('video-progress-heartbeat')
+        kept = Video.objects.create(title='Kept', description='Kept', original_file='videos/originals/kept.mp4')
+        deleted = Video.objects.create(title='Deleted', description='Deleted', original_file='videos/originals/deleted.mp4')
+        redis = FakeRedis()
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        with mock.patch('videoflix_app.progress.redis_connection', return_value=redis), \
+                mock.patch('videoflix_app.tasks.redis_connection', return_value=redis), \
+                mock.patch('videoflix_app.progress.PROGRESS_BUFFERED', True), \
+                mock.patch('videoflix_app.api.views.PROGRESS_BUFFERED', True), \
+                mock.patch('videoflix_app.queues.django_rq'):
+            response = self.client.post(url, {'video': kept.id, 'current_time': 42}, format='json')
+            self.client.post(url, {'video': deleted.id, 'current_time': 10}, format='json')
+            progress = self.client.get(reverse('video-progress-get-user-progress'), {'video': kept.id})
+            deleted.delete()
+            flushed = flush_progress_buffer()
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(progress.data['current_time'], 42)
+        self.assertEqual(flushed, 1)
+        self.assertEqual(VideoProgress.objects.get(user=self.user).current_time, 42)
+        self.assertEqual(redis.hashes, {})
+
+
+    def test_continue_watching(self):
+        url = reverse('video-progress-continue-watching')
+        started = Video.objects.create(title='Started', description='Started', original_file='videos/originals/a.mp4', duration=200)
+        finished = Video.objects.create(title='Finished', description='Finished', original_file='videos/originals/b.mp4', duration=100)
+        VideoProgress.objects.create(user=self.user, video=started, current_time=50)
+        VideoProgress.objects.create(user=self.user, video=finished, current_time=99)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['video']['title'], 'Started')
+        self.assertEqual(response.data[0]['percent_watched'], 25.0)
+
+
+class VideoStreamTest(TempMediaRootMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        os.makedirs(os.path.join(self.media_root, 'videos', '480p'))
+        with open(os.path.join(self.media_root, 'videos', '480p', 'clip_480p.mp4'), 'wb') as f:
+            f.write(b'0123456789')
+
+        self.video = Video.objects.create(
+            title='Clip', description='Clip', original_file='videos/originals/clip.mp4', video_480p='videos/480p/clip_480p.mp4')
+
+        self.user = User.objects.create_user(
+            username='user@test.de', password='testpassword', email='user@test.de', is_email_verified=True)
+        self.token = AuthToken.objects.create(user=self.user)
+        self.client = APIClient()
+        self.url = reverse('video-stream', kwargs={'pk': self.video.pk, 'resolution': '480p'})
+
+
+    def test_stream_unauthenticated(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+    def test_stream_full_file(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+
+    def test_stream_range(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+
+    def test_stream_range_from_s3(self):
+        obj = mock.Mock()
+        obj.get.return_value = {'Body': mock.Mock(iter_chunks=mock.Mock(return_value=iter([b'23', b'45'])))}
+        storage = mock.Mock(size=mock.Mock(return_value=10))
+        storage.bucket.Object.return_value = obj
+        storage.get_modified_time.return_value = default_storage.get_modified_time('videos/480p/clip_480p.mp4')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        with mock.patch('videoflix_app.streaming.default_storage', storage):
+            response = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+            content = b''.join(response.streaming_content)
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(content, b'2345')
+        obj.get.assert_called_once_with(Range='bytes=2-5')
+        storage.open.assert_not_called()
+
+
+    def test_stream_range_not_satisfiable(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=20-')
+
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+
+    def test_stream_not_modified(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+@override_settings(STORAGES=OBJECT_STORAGES)
+class ObjectStorageStreamTest(VideoStreamTest):
+    """
+    Runs the streaming tests against the object store stand-in, which has no local paths.
+    """
+
+
+@override_settings(STORAGES=OBJECT_STORAGES)
+class MediaStorageTest(TempMediaRootMixin, SimpleTestCase):
+
+    def test_package_storage_links_unsigned(self):
+        packages = {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'base_url': 'https://cdn.test/'}}
+
+        with override_settings(STORAGES={**OBJECT_STORAGES, 'packages': packages}):
+            url = PackageStorage().url('videos/hls/1/master.m3u8')
+
+        self.assertEqual(url, 'https://cdn.test/videos/hls/1/master.m3u8')
+
+
+    def test_store_fetch_and_delete_directory(self):
+        with work_dir(1) as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, 'hls', '480p'))
+            for name in ['master.m3u8', os.path.join('480p', 'index.m3u8')]:
+                with open(os.path.join(tmp_dir, 'hls', name), 'w') as f:
+                    f.write('#EXTM3U')
+            stored = store_directory(os.path.join(tmp_dir, 'hls'), media_prefix('hls', 1))
+
+            fetched = fetch('videos/hls/1/480p/index.m3u8', tmp_dir)
+            self.assertFalse(os.path.islink(fetched))
+            with open(fetched) as f:
+                self.assertEqual(f.read(), '#EXTM3U')
+
+        self.assertEqual(sorted(stored), ['videos/hls/1/480p/index.m3u8', 'videos/hls/1/master.m3u8'])
+        delete_prefix(media_prefix('hls', 1))
+        self.assertFalse(default_storage.exists('videos/hls/1/master.m3u8'))
+        self.assertFalse(default_storage.exists('videos/hls/1/480p/index.m3u8'))
+
+
+    def test_probe_location_reads_object_store_through_url(self):
+        storage = mock.Mock(path=mock.Mock(side_effect=NotImplementedError))
+        storage.url.return_value = 'https://media.test/videos/originals/clip.mp4?signature=1'
+
+        with mock.patch('videoflix_app.storage.default_storage', storage):
+            location = probe_location('videos/originals/clip.mp4', self.media_root)
+
+        self.assertEqual(location, 'https://media.test/videos/originals/clip.mp4?signature=1')
+        storage.open.assert_not_called()
+
+
+@override_settings(STORAGES=OBJECT_STORAGES)
+class VideoUploadTest(TempMediaRootMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.user = User.objects.create_user(
+            username='user@test.de', password='testpassword', email='user@test.de', is_email_verified=True)
+        self.token = AuthToken.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+        response = self.client.post(reverse('video-upload-list'), {
+            'filename': 'clip.mp4', 'size': 10, 'title': 'Clip', 'description': 'Clip'}, format='json')
+        self.upload_id = response.data['id']
+        self.url = reverse('video-upload-detail', kwargs={'pk': self.upload_id})
+
+
+    def send_chunk(self, chunk, offset, checksum=None):
+        headers = {'HTTP_UPLOAD_OFFSET': str(offset)}
+        if checksum:
+            headers['HTTP_UPLOAD_CHECKSUM'] = checksum
+        return self.client.patch(self.url, chunk, content_type='application/offset+octet-stream', **headers)
+
+
+    def test_upload_in_chunks_creates_video(self):
+        checksum = 'sha256 ' + base64.b64encode(hashlib.sha256(b'01234').digest()).decode()
+        first = self.send_chunk(b'01234', 0, checksum)
+
+        with mock.patch('videoflix_app.queues.django_rq') as django_rq, self.captureOnCommitCallbacks(execute=True):
+            last = self.send_chunk(b'56789', 5)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first['Upload-Offset'], '5')
+        self.assertEqual(last.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(last.data['state'], 'assembling')
+        self.assertIsNone(last.data['video'])
+        queue = django_rq.get_queue.return_value
+        self.assertEqual(queue.enqueue.call_args.args, (assemble_upload, self.upload_id))
+        self.assertEqual(self.send_chunk(b'', 10).status_code, status.HTTP_409_CONFLICT)
+
+        assemble_upload(self.upload_id)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['state'], 'completed')
+        video = Video.objects.get(pk=response.data['video'])
+        with video.original_file.open('rb') as f:
+            self.assertEqual(f.read(), b'0123456789')
+        self.assertEqual(default_storage.listdir(f'videos/uploads/{self.upload_id}')[1], [])
+
+
+    def test_upload_checksum_mismatch(self):
+        checksum = 'sha256 ' + base64.b64encode(hashlib.sha256(b'other').digest()).decode()
+        response = self.send_chunk(b'01234', 0, checksum)
+
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(self.client.head(self.url)['Upload-Offset'], '0')
+
+
+    def test_upload_wrong_offset(self):
+        response = self.send_chunk(b'56789', 5)
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], 0)
+
+
+@override_settings(STORAGES=OBJECT_STORAGES)
+class MediaGarbageTest(TempMediaRootMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.delete(MEDIA_GC_SCHEDULED_KEY)
+        invalidate_catalogue()
+
+        for name in ['videos/originals/clip.mp4', 'videos/480p/clip_480p.mp4', 'videos/hls/1/master.m3u8']:
+            default_storage.save(name, io.BytesIO(b'data'))
+        self.video = Video.objects.create(
+            id=1, title='Clip', description='Clip', original_file='videos/originals/clip.mp4',
+            video_480p='videos/480p/clip_480p.mp4')
+
+
+    def test_delete_writes_tombstones_and_collects_after_commit(self):
+        with mock.patch('videoflix_app.queues.django_rq') as django_rq:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.video.delete()
+
+            self.assertTrue(default_storage.exists('videos/originals/clip.mp4'))
+            self.assertEqual(MediaTombstone.objects.count(), 7)
+            django_rq.get_queue.assert_called_once_with('maintenance', autocommit=True)
+            collected = collect_media_garbage()
+
+        self.assertEqual(collected, 7)
+        self.assertEqual(MediaTombstone.objects.count(), 0)
+        self.assertFalse(default_storage.exists('videos/originals/clip.mp4'))
+        self.assertFalse(default_storage.exists('videos/480p/clip_480p.mp4'))
+        self.assertFalse(default_storage.exists('videos/hls/1/master.m3u8'))
+
+
+    def test_rolled_back_delete_keeps_files(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.video.delete()
+            raise RuntimeError()
+
+        self.assertEqual(MediaTombstone.objects.count(), 0)
+        self.assertTrue(Video.objects.filter(pk=1).exists())
+
+
+    def test_collect_keeps_referenced_files(self):
+        MediaTombstone.objects.create(name='videos/originals/clip.mp4')
+
+        with mock.patch('videoflix_app.queues.django_rq'):
+            collect_media_garbage()
+
+        self.assertEqual(MediaTombstone.objects.count(), 0)
+        self.assertTrue(default_storage.exists('videos/originals/clip.mp4'))
+
+
+    def test_reconcile_finds_orphans(self):
+        default_storage.save('videos/720p/lost_720p.mp4', io.BytesIO(b'data'))
+        default_storage.save('videos/dash/99/manifest.mpd', io.BytesIO(b'data'))
+        out = io.StringIO()
+
+        with mock.patch('videoflix_app.queues.django_rq'), self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_media', '--delete', '--min-age', '0', stdout=out)
+
+        self.assertIn('videos/720p/lost_720p.mp4', out.getvalue())
+        self.assertIn('videos/dash/99/', out.getvalue())
+        self.assertEqual(
+            sorted(MediaTombstone.objects.values_list('name', 'is_prefix')),
+            [('videos/720p/lost_720p.mp4', False), ('videos/dash/99', True)])
+
+
+    def test_reconcile_keeps_recent_directories(self):
+        default_storage.save('videos/dash/99/manifest.mpd', io.BytesIO(b'data'))
+        out = io.StringIO()
+
+        call_command('reconcile_media', '--delete', '--min-age', '24', stdout=out)
+
+        self.assertNotIn('videos/dash/99/', out.getvalue())
+        self.assertEqual(MediaTombstone.objects.count(), 0)
+
+
+    def test_reconcile_rechecks_videos_before_burying(self):
+        out = io.StringIO()
+
+        with mock.patch('videoflix_app.management.commands.reconcile_media.Command.referenced_media', return_value=(set(), set())), \
+                mock.patch('videoflix_app.queues.django_rq'), self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_media', '--delete', '--min-age', '0', stdout=out)
+
+        self.assertIn('videos/hls/1/', out.getvalue())
+        self.assertEqual(MediaTombstone.objects.count(), 0)
+
+
+class VideoImportTest(TempMediaRootMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        invalidate_catalogue()
+
+        for name in ['a_sports.mp4', 'b_crime.mp4', 'c_crime.mp4', 'a_sports.png']:
+            with open(os.path.join(self.folder, name), 'wb') as f:
+                f.write(b'data')
+        self.manifest = os.path.join(self.folder, 'videos.json')
+        with open(self.manifest, 'w') as f:
+            json.dump([
+                {'file': 'a_sports.mp4', 'title': 'A', 'description': 'A', 'thumbnail': 'a_sports.png'},
+                {'file': 'b_crime.mp4', 'title': 'B', 'description': 'B'},
+                {'file': 'c_crime.mp4', 'title': 'C', 'description': 'C'},
+                {'file': 'missing.mp4', 'title': 'D', 'description': 'D'},
+                {'title': 'E', 'description': 'E'},
+            ], f)
+
+
+    def test_import_from_manifest(self):
+        metadata = {'duration': 60.0, 'width': 1920, 'height': 1080}
+        out = io.StringIO()
+
+        with mock.patch('videoflix_app.management.commands.create_video_list.inspect_media', return_value=metadata), \
+                mock.patch('videoflix_app.queues.django_rq') as django_rq, \
+                self.captureOnCommitCallbacks(execute=True):
+            queue = django_rq.get_queue.return_value
+            queue.enqueue.side_effect = ['job-a', 'job-b', 'job-c']
+            call_command('create_video_list', '--manifest', self.manifest, '--concurrency', '2', stdout=out)
+
+        videos = Video.objects.order_by('title')
+        self.assertEqual([video.title for video in videos], ['A', 'B', 'C'])
+        self.assertIn('No file given', out.getvalue())
+        self.assertEqual(videos[0].duration, 60.0)
+        self.assertTrue(os.path.samefile(videos[0].original_file.path, os.path.join(self.folder, 'a_sports.mp4')))
+        self.assertTrue(os.path.samefile(videos[0].thumbnail.path, os.path.join(self.folder, 'a_sports.png')))
+        django_rq.get_queue.assert_called_with('transcode-bulk', autocommit=True)
+        dependencies = [call.kwargs['depends_on'] for call in queue.enqueue.call_args_list]
+        self.assertEqual(dependencies[:2], [None, None])
+        self.assertEqual(dependencies[2].dependencies, ['job-a'])
+        self.assertEqual(len(queue.enqueue_many.call_args.args[0]), 1)
+
+
+class VideoSearchTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user@test.de', password='testpassword', email='user@test.de', is_email_verified=True)
+        self.token = AuthToken.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        invalidate_catalogue()
+
+        Video.objects.create(title='Giants of the Ocean', description='The lives of whales.')
+        Video.objects.create(title='Castles Through Time', description='Giant walls and towers.')
+        Video.objects.create(title='Police on the Beat', description='Officers investigate crime.')
+
+
+    def search(self, text):
+        response = self.client.get(reverse('video-search'), {'q': text})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [video['title'] for video in response.data]
+
+
+    def test_search_query_matches_prefixes(self):
+        self.assertIsNone(search_query(' !? '))
+        self.assertEqual(
+            search_query("giant oce'an"), SearchQuery('giant:* & oce:* & an:*', search_type='raw', config='english'))
+
+
+    @skipUnless(connection.vendor == 'postgresql', 'Full-text search requires PostgreSQL.')
+    def test_search_ranks_title_above_description(self):
+        self.assertEqual(self.search('giant'), ['Giants of the Ocean', 'Castles Through Time'])
+
+
+    @skipUnless(connection.vendor == 'postgresql', 'Full-text search requires PostgreSQL.')
+    def test_search_type_ahead_prefix(self):
+        self.assertEqual(self.search('police be'), ['Police on the Beat'])
+
+
+    @skipUnless(connection.vendor == 'postgresql', 'Full-text search requires PostgreSQL.')
+    def test_search_tolerates_typos(self):
+        self.assertEqual(self.search('Castels Trough Time'), ['Castles Through Time'])
+
+
+class TranscodeCommandTest(SimpleTestCase):
+
+    def test_single_pass_command_decodes_once(self):
+        cmd = build_single_pass_command('/media/videos/originals/clip.mp4', ['480p', '720p', '1080p'])
+
+        self.assertEqual(cmd.count('-i'), 1)
+        self.assertIn('[0:v]split=3[s0][s1][s2]', cmd[cmd.index('-filter_complex') + 1])
+        self.assertEqual(cmd[-1], '/media/videos/originals/clip_1080p.mp4')
+        self.assertEqual(cmd.count('-map'), 6)
+
+
+    def test_hls_command_maps_every_rendition(self):
+        renditions = [('480p', '/media/videos/480p/clip_480p.mp4'), ('720p', '/media/videos/720p/clip_720p.mp4')]
+        cmd = build_hls_command(renditions, '/media/videos/hls/1', with_audio=True)
+
+        self.assertEqual(cmd[cmd.index('-var_stream_map') + 1], 'v:0,a:0,name:480p v:1,a:1,name:720p')
+        self.assertEqual(cmd[cmd.index('-c') + 1], 'copy')
+        self.assertEqual(cmd[-1], '/media/videos/hls/1/%v/index.m3u8')
+
+
+    def test_parse_ffmpeg_progress(self):
+        values = {'out_time_us': '30000000', 'fps': '48.5', 'speed': '2.0x', 'progress': 'continue'}
+
+        self.assertEqual(parse_progress_block(values, 120.0), (25.0, 48.5, 2.0, 45))
+        self.assertEqual(parse_progress_block(dict(values, progress='end'), 120.0)[0], 100.0)
+
+
+    def test_encoder_args_from_profile(self):
+        args = encoder_args({'preset': 'slow', 'crf': 21, 'maxrate': '3000k', 'bufsize': '6000k'})
+
+        self.assertEqual(args[args.index('-preset') + 1], 'slow')
+        self.assertEqual(args[args.index('-crf') + 1], '21')
+        self.assertEqual(args[args.index('-maxrate') + 1], '3000k')
+
+
+    def test_adjust_profiles_for_easy_content(self):
+        profiles = {'720p': {'height': 720, 'field': 'video_720p', 'crf': 23, 'maxrate': '3000k', 'bufsize': '6000k'}}
+        adjusted = adjust_profiles('low', profiles)
+
+        self.assertEqual(adjusted['720p']['crf'], 26)
+        self.assertEqual(adjusted['720p']['maxrate'], '2100k')
+        self.assertEqual(profiles['720p']['crf'], 23)
+
+
+    def test_parse_probe_swaps_size_of_rotated_video(self):
+        data = {
+            'format': {'duration': '12.5', 'bit_rate': '4200000'},
+            'streams': [
+                {'codec_type': 'video', 'codec_name': 'h264', 'width': 1920, 'height': 1080,
+                 'avg_frame_rate': '30000/1001', 'side_data_list': [{'rotation': -90}]},
+                {'codec_type': 'audio', 'channels': 2, 'channel_layout': 'stereo'},
+            ],
+        }
+        media = parse_probe(data)
+
+        self.assertEqual((media['width'], media['height']), (1080, 1920))
+        self.assertEqual(media['frame_rate'], 29.97)
+        self.assertEqual(media['bitrate'], 4200000)
+        self.assertEqual((media['audio_channels'], media['audio_layout']), (2, 'stereo'))
+
+
+    def test_select_renditions_skips_upscaling(self):
+        self.assertEqual(select_renditions(854, 480), ['480p'])
+        self.assertEqual(select_renditions(1080, 1920), ['480p', '720p', '1080p'])
+        self.assertEqual(select_renditions(320, 240), ['480p'])
+
+
+    def test_scale_filter_keeps_aspect_ratio(self):
+        self.assertEqual(scale_filter({'height': 720}, 1080, 1920), 'scale=720:-2')
+        self.assertEqual(scale_filter({'height': 480}, 320, 240), 'scale=-2:240')
+        self.assertEqual(scale_filter({'height': 480}), 'scale=-2:480')
+
+
+    def test_segmented_commands(self):
+        split = build_split_command('/media/videos/originals/clip.mp4', '/media/videos/segments/1', 60)
+        segment = build_segment_command('/media/videos/segments/1/part_00003.mp4', '720p')
+        concat = build_concat_command('/media/videos/segments/1/720p.txt', '/media/videos/originals/clip.mp4',
+                                      '/media/videos/originals/clip_720p.mp4', {'height': 720})
+
+        self.assertEqual(split[split.index('-c') + 1], 'copy')
+        self.assertEqual(split[split.index('-segment_time') + 1], '60')
+        self.assertEqual(split[-1], '/media/videos/segments/1/part_%05d.mp4')
+        self.assertIn('-an', segment)
+        self.assertEqual(segment[-1], '/media/videos/segments/1/part_00003_720p.mp4')
+        self.assertEqual(concat[concat.index('-c:v') + 1], 'copy')
+        self.assertIn('1:a?', concat)
+
+
+    def test_transcode_routing_and_timeout(self):
+        self.assertEqual(transcode_queue_name(120.0), 'transcode-high')
+        self.assertEqual(transcode_queue_name(5400.0), 'default')
+        self.assertEqual(transcode_queue_name(120.0, 'bulk'), 'transcode-bulk')
+        self.assertEqual(transcode_queue_name(5400.0, 'high'), 'transcode-high')
+        self.assertEqual(transcode_timeout(5400.0, 3), 5400 * 3 * 4)
+        self.assertEqual(transcode_timeout(10.0), 600)
+        self.assertIsNone(transcode_timeout(None))
+
+
+    def test_thumbnail_vtt_points_to_sprite_tiles(self):
+        vtt = build_thumbnail_vtt(1005.0, (160, 90))
+        cues = vtt.split('\n\n')
+
+        self.assertTrue(vtt.startswith('WEBVTT\n'))
+        self.assertEqual(cues[2], '00:00:10.000 --> 00:00:20.000\nsprite_000.jpg#xywh=160,0,160,90')
+        self.assertEqual(cues[12], '00:01:50.000 --> 00:02:00.000\nsprite_000.jpg#xywh=160,90,160,90')
+        self.assertEqual(cues[101].rstrip(), '00:16:40.000 --> 00:16:45.000\nsprite_001.jpg#xywh=0,0,160,90')
+        self.assertEqual(tile_size(1080, 1920), (160, 284))
+
+
+    def test_poster_command_writes_every_width(self):
+        cmd = build_poster_command('/media/img/poster.png', '/media/videos/posters/1', 'webp', [320, 640])
+
+        self.assertEqual(cmd.count('-i'), 1)
+        self.assertIn('scale=320:-2', cmd)
+        self.assertEqual(cmd[cmd.index('-c:v') + 1], 'libwebp')
+        self.assertEqual(cmd[-1], '/media/videos/posters/1/poster_640.webp')
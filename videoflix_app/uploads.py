@@ -0,0 +1,153 @@
+import base64
+import hashlib
+import os
+import tempfile
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from .models import Video
+from .queues import TRANSCODE_DEFAULT, get_queue
+from .storage import WORK_DIR, delete_prefix
+
+
+UPLOAD_DIR = 'videos/originals/'
+CHUNK_DIR = 'videos/uploads/'
+UPLOAD_READ_SIZE = 1024 * 1024
+UPLOAD_MAX_CHUNK_SIZE = getattr(settings, 'VIDEO_UPLOAD_MAX_CHUNK_SIZE', 64 * 1024 * 1024)
+UPLOAD_ASSEMBLY_TIMEOUT = getattr(settings, 'VIDEO_UPLOAD_ASSEMBLY_TIMEOUT', 60 * 60)
+CHECKSUM_ALGORITHMS = {'md5': hashlib.md5, 'sha1': hashlib.sha1, 'sha256': hashlib.sha256}
+
+
+class ChecksumMismatch(Exception):
+    """
+    Raised when a chunk does not match the checksum sent by the client.
+    """
+
+
+def original_storage():
+    """
+    Returns the storage of `Video.original_file`.
+    """
+    return Video._meta.get_field('original_file').storage
+
+
+def chunk_prefix(upload):
+    """
+    Returns the storage prefix which holds the received chunks of an upload.
+    """
+    return f'{CHUNK_DIR}{upload.id}'
+
+
+def chunk_name(upload, offset):
+    """
+    Returns the storage name of the chunk which starts at `offset`.
+    """
+    return f'{chunk_prefix(upload)}/{offset:015d}.chunk'
+
+
+def parse_checksum(header):
+    """
+    Parses an `Upload-Checksum` header (`<algorithm> <base64 digest>`) into (hash object, digest).
+    Returns (None, None) without header, raises ValueError for unsupported algorithms.
+    """
+    if not header:
+        return None, None
+    algorithm, _, digest = header.partition(' ')
+    if algorithm.lower() not in CHECKSUM_ALGORITHMS:
+        raise ValueError(f'Unsupported checksum algorithm: {algorithm}')
+    return CHECKSUM_ALGORITHMS[algorithm.lower()](), base64.b64decode(digest)
+
+
+def append_chunk(upload, stream, length, checksum_header=None):
+    """
+    Streams one chunk from the request into the media storage.
+
+    Object stores can not append to a file, so every chunk is stored as its own object named
+    after its offset. The chunk is read in blocks of UPLOAD_READ_SIZE and hashed while it is
+    spooled to a temporary file. If the checksum does not match, nothing is stored and
+    `ChecksumMismatch` is raised, so the client can simply send the chunk again.
+
+    Args:
+        upload (VideoUpload): The upload, locked by the caller.
+        stream: File-like object of the request body.
+        length (int): Length of the chunk (Content-Length).
+        checksum_header (str): Optional value of the `Upload-Checksum` header.
+
+    Returns:
+        int: The new offset of the upload.
+    """
+    hasher, expected = parse_checksum(checksum_header)
+    storage = original_storage()
+
+    with tempfile.TemporaryFile(dir=WORK_DIR) as f:
+        remaining = min(length, upload.size - upload.offset)
+        while remaining > 0:
+            block = stream.read(min(UPLOAD_READ_SIZE, remaining))
+            if not block:
+                break
+            if hasher:
+                hasher.update(block)
+            f.write(block)
+            remaining -= len(block)
+
+        if hasher and hasher.digest() != expected:
+            raise ChecksumMismatch()
+        written = f.tell()
+        if written:
+            f.seek(0)
+            name = chunk_name(upload, upload.offset)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, File(f))
+        upload.offset += written
+
+    upload.save(update_fields=['offset'])
+    return upload.offset
+
+
+def schedule_assembly(upload):
+    """
+    Enqueues the `assemble_upload` job once the transaction which stored the last chunk has been
+    committed. Joining a multi-GB original takes minutes, so it does not run in the request.
+    """
+    from .tasks import assemble_upload
+    transaction.on_commit(lambda: get_queue(TRANSCODE_DEFAULT).enqueue(
+        assemble_upload, str(upload.pk), job_timeout=UPLOAD_ASSEMBLY_TIMEOUT))
+
+
+def complete_upload(upload):
+    """
+    Joins the stored chunks in the order of their offsets into the original file and creates
+    the `Video`. Saving the video starts the conversion through the `post_save` signal.
+    Chunks of aborted attempts at other offsets are skipped. Runs in the `assemble_upload` job.
+    """
+    storage = original_storage()
+    name = UPLOAD_DIR + storage.get_valid_name(os.path.basename(upload.filename))
+
+    with tempfile.TemporaryFile(dir=WORK_DIR) as f:
+        while f.tell() < upload.size:
+            with storage.open(chunk_name(upload, f.tell()), 'rb') as chunk:
+                for block in chunk.chunks(UPLOAD_READ_SIZE):
+                    f.write(block)
+        f.seek(0)
+        name = storage.save(name, File(f))
+    delete_prefix(chunk_prefix(upload))
+
+    with transaction.atomic():
+        video = Video.objects.create(
+            title=upload.title,
+            description=upload.description,
+            original_file=name,
+            thumbnail=upload.thumbnail.name or None,
+        )
+        upload.video = video
+        upload.thumbnail = None
+        upload.save(update_fields=['video', 'thumbnail'])
+    return video
+
+
+def discard_upload(upload):
+    """
+    Removes the stored chunks of an unfinished upload.
+    """
+    delete_prefix(chunk_prefix(upload))